@@ -64,4 +64,16 @@ CROSSWALK_THRESH_SPEND = 10
 
 # --- Running Mode ---
 MODE = "main" # it can be "city" or "race" too
-CONFIG_MODULE = None
\ No newline at end of file
+CONFIG_MODULE = None
+
+# --- Profiling ---
+PROFILE = False # record stage timings, served on /profile by the stream
+PROFILE_DUMP_PATH = "profile.json" # summary written here at exit
+
+# --- Lane Engine ---
+# "hough": threshold + Canny + HoughLinesP per lane ROI
+# "histogram": threshold + column histogram + sliding windows
+LANE_ENGINE = "hough"
+HIST_WINDOWS = 4 # sliding windows stacked over the ROI height
+HIST_MARGIN = 15 # px, half-width of a window
+HIST_MIN_PIXELS = 10 # white pixels needed to (re)centre a window
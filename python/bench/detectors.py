@@ -0,0 +1,165 @@
+import importlib
+import cv2
+from utils.runtime_config import get_runtime_config
+
+
+def _headless(config_name, overrides=None):
+    """Turn off DEBUG/STREAM drawing so a run needs no display."""
+    config = importlib.import_module(config_name)
+    values = {"DEBUG": False, "STREAM": False}
+    values.update(overrides or {})
+    runtime = get_runtime_config(config)
+    previous = {name: runtime.get(name) for name in values if runtime.get(name) is not None}
+    runtime.update(values)
+    return config, runtime, previous
+
+
+class LaneBench:
+    """Adapter around one of the lane VisionProcessor modules."""
+    def __init__(self, module_name, config_name, overrides=None, scale=1.0):
+        self.module_name = module_name
+        self.config_name = config_name
+        self.overrides = overrides or {}
+        self.scale = scale
+        self.processor = None
+        self.size = None
+        self._previous = {}
+
+    def setup(self):
+        config, runtime, self._previous = _headless(self.config_name, self.overrides)
+        cfg = runtime.snapshot()
+        self.size = (int(cfg.default_width * self.scale), int(cfg.default_height * self.scale))
+        module = importlib.import_module(self.module_name)
+        # lane processors keep per-lane state, so each run starts fresh
+        self.processor = module.VisionProcessor()
+
+    def teardown(self):
+        # undo variant overrides so the next detector sees the stock config
+        config = importlib.import_module(self.config_name)
+        get_runtime_config(config).update(self._previous)
+
+    def prepare(self, frame):
+        # the drive loops resize before detect; do it outside the timed part
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def run(self, frame):
+        result = self.processor.detect(frame)
+        return {
+            "steering_angle": int(result["steering_angle"]),
+            "lane_type": result["lane_type"],
+            "crosswalk": bool(result.get("crosswalk", False)),
+        }
+
+
+class ApriltagBench:
+    def __init__(self, config_name="config_city", overrides=None, scale=1.0):
+        self.config_name = config_name
+        self.overrides = overrides or {}
+        self.scale = scale
+        self.detector = None
+        self._previous = {}
+
+    def setup(self):
+        config, _, self._previous = _headless(self.config_name, self.overrides)
+        from vision.apriltag import ApriltagDetector
+        self.detector = ApriltagDetector(config)
+
+    def teardown(self):
+        config = importlib.import_module(self.config_name)
+        get_runtime_config(config).update(self._previous)
+
+    def prepare(self, frame):
+        if self.scale != 1.0:
+            return cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        # detect() draws on the frame it is given
+        return frame.copy()
+
+    def run(self, frame):
+        tags, _, largest_tag = self.detector.detect(frame)
+        return {
+            "tags": sorted(int(tag["id"]) for tag in tags),
+            "largest_tag": int(largest_tag["id"]) if largest_tag is not None else None,
+            # corners in full-resolution pixels, whatever scale was run
+            "corners": {
+                str(int(tag["id"])): (tag["corners"] / self.scale).round(1).tolist()
+                for tag in tags
+            },
+        }
+
+
+class TrafficLightBench:
+    def __init__(self, overrides=None, scale=1.0):
+        self.overrides = overrides or {}
+        self.scale = scale
+        self.detector = None
+        self._previous = {}
+
+    def setup(self):
+        _, _, self._previous = _headless("config_city", self.overrides)
+        from vision.traffic_light import TrafficLightDetector
+        self.detector = TrafficLightDetector()
+
+    def teardown(self):
+        import config_city
+        get_runtime_config(config_city).update(self._previous)
+
+    def prepare(self, frame):
+        if self.scale != 1.0:
+            return cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def run(self, frame):
+        color, _ = self.detector.detect(frame)
+        return {"light": color}
+
+
+DETECTORS = {
+    "city": lambda **kw: LaneBench("vision.city_vision_processing", "config_city", **kw),
+    "race": lambda **kw: LaneBench("vision.race_vision_processing", "config_race", **kw),
+    "main": lambda **kw: LaneBench("vision.vision_processing", "base_config", **kw),
+    "apriltag": lambda **kw: ApriltagBench(**kw),
+    "traffic_light": lambda **kw: TrafficLightBench(**kw),
+}
+
+
+def _parse_value(text):
+    lowered = text.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_variant(spec):
+    """
+        Parse "name[:key=value,...]" into (name, scale, skip, overrides).
+        scale resizes frames before detect, skip=N runs the detector on
+        every Nth frame only, UPPERCASE keys override config values, e.g.
+        "city:scale=0.5,skip=2" or "race:LANE_ENGINE=histogram".
+    """
+    name, _, options = spec.partition(":")
+    scale, skip, overrides = 1.0, 1, {}
+    for item in filter(None, options.split(",")):
+        key, _, value = item.partition("=")
+        if key == "scale":
+            scale = float(value)
+        elif key == "skip":
+            skip = max(1, int(value))
+        elif key.isupper():
+            overrides[key] = _parse_value(value)
+        else:
+            raise ValueError(f"unknown variant option {key!r} in {spec!r}")
+    if name not in DETECTORS:
+        raise ValueError(f"unknown detector {name!r}, choose from {sorted(DETECTORS)}")
+    return name, scale, skip, overrides
+
+
+def make_detector(spec):
+    name, scale, _, overrides = parse_variant(spec)
+    return DETECTORS[name](overrides=overrides, scale=scale)
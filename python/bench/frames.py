@@ -0,0 +1,51 @@
+import os
+import cv2
+import numpy as np
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+VIDEO_EXTS = (".mp4", ".avi", ".mkv", ".mov", ".h264")
+
+
+def load_frames(source, limit=None, step=1):
+    """
+        Load a recorded frame set as a list of (name, BGR frame).
+        source can be a directory of images (sorted by name), a video file
+        or an .npz archive of frames saved with np.savez.
+    """
+    frames = []
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTS))
+        for name in names[::step]:
+            frame = cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            frames.append((name, frame))
+            if limit and len(frames) >= limit:
+                break
+    elif source.lower().endswith(".npz"):
+        with np.load(source) as data:
+            for name in sorted(data.files)[::step]:
+                frames.append((name, data[name]))
+                if limit and len(frames) >= limit:
+                    break
+    elif source.lower().endswith(VIDEO_EXTS):
+        cap = cv2.VideoCapture(source)
+        index = 0
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if index % step == 0:
+                    frames.append((f"{index:06d}", frame))
+                    if limit and len(frames) >= limit:
+                        break
+                index += 1
+        finally:
+            cap.release()
+    else:
+        raise ValueError(f"unsupported frame source: {source}")
+
+    if not frames:
+        raise ValueError(f"no frames found in {source}")
+    return frames
@@ -0,0 +1,155 @@
+# =========================
+# bench/golden.py
+# =========================
+# Accuracy + latency harness over a labelled corpus ("golden frames").
+# Every detector variant is scored on how often it matches the labels and
+# on how long it takes per frame; the report marks the Pareto front so a
+# faster approximation (downscaling, frame skipping, another engine) can
+# be accepted with evidence:
+#
+#   cd python
+#   python -m bench.golden recordings/track1 recordings/track1_labels.json \
+#       --variants city city:scale=0.5 city:skip=2 apriltag apriltag:scale=0.5
+#
+# Labels file:
+#   {
+#     "steering_tolerance": 5,        # degrees
+#     "corner_tolerance": 4.0,        # pixels, full resolution
+#     "frames": {
+#       "000120.png": {"steering_angle": 96, "lane_type": "both", "crosswalk": false},
+#       "000300.png": {"tags": [{"id": 5, "corners": [[x, y], [x, y], [x, y], [x, y]]}]}
+#     }
+#   }
+# Only the fields present for a frame are scored.
+import argparse
+import json
+import logging
+import sys
+
+from bench.frames import load_frames
+from bench.detectors import make_detector, parse_variant
+from bench.run import bench_detector
+
+logger = logging.getLogger(__name__)
+
+LANE_FIELDS = ("steering_angle", "lane_type", "crosswalk")
+
+
+def _tags_match(output, expected, corner_tolerance):
+    if sorted(t["id"] for t in expected) != output.get("tags"):
+        return False
+    corners = output.get("corners", {})
+    for tag in expected:
+        if "corners" not in tag:
+            continue
+        got = corners.get(str(tag["id"]))
+        if got is None:
+            return False
+        for (gx, gy), (ex, ey) in zip(got, tag["corners"]):
+            if abs(gx - ex) > corner_tolerance or abs(gy - ey) > corner_tolerance:
+                return False
+    return True
+
+
+def score_frame(output, expected, steering_tolerance, corner_tolerance):
+    """Return {field: 1/0} for each labelled field this detector produces."""
+    scores = {}
+    for field in LANE_FIELDS:
+        if field not in expected or field not in output:
+            continue
+        if field == "steering_angle":
+            ok = abs(output[field] - expected[field]) <= steering_tolerance
+        else:
+            ok = output[field] == expected[field]
+        scores[field] = int(ok)
+    if "tags" in expected and "tags" in output:
+        scores["tags"] = int(_tags_match(output, expected["tags"], corner_tolerance))
+    return scores
+
+
+def evaluate(spec, frames, labels, steering_tolerance, corner_tolerance, repeat=1):
+    skip = parse_variant(spec)[2]
+    result = bench_detector(make_detector(spec), frames, repeat=repeat, skip=skip)
+
+    totals = {}
+    for output in result["outputs"]:
+        expected = labels.get(output["frame"])
+        if not expected:
+            continue
+        for field, ok in score_frame(output, expected, steering_tolerance, corner_tolerance).items():
+            hit, n = totals.get(field, (0, 0))
+            totals[field] = (hit + ok, n + 1)
+
+    fields = {field: hit / n for field, (hit, n) in totals.items()}
+    scored = sum(n for _, n in totals.values())
+    return {
+        "variant": spec,
+        "accuracy": sum(hit for hit, _ in totals.values()) / scored if scored else None,
+        "fields": fields,
+        "scored": scored,
+        "fps": result["fps"],
+        "mean_ms": result["latency"].get("mean_ms", 0.0),
+        "p95_ms": result["latency"].get("p95_ms", 0.0),
+    }
+
+
+def pareto_front(rows):
+    """Variants not beaten on both accuracy and mean time by another one."""
+    front = []
+    for row in rows:
+        if row["accuracy"] is None:
+            continue
+        dominated = any(
+            other is not row and other["accuracy"] is not None
+            and other["accuracy"] >= row["accuracy"] and other["mean_ms"] <= row["mean_ms"]
+            and (other["accuracy"] > row["accuracy"] or other["mean_ms"] < row["mean_ms"])
+            for other in rows
+        )
+        if not dominated:
+            front.append(row["variant"])
+    return front
+
+
+def format_report(rows, front):
+    lines = [f"{'variant':<36} {'accuracy':>8} {'mean ms':>8} {'p95 ms':>8} {'fps':>7}  fields"]
+    for row in sorted(rows, key=lambda r: r["mean_ms"]):
+        acc = f"{row['accuracy']:.3f}" if row["accuracy"] is not None else "n/a"
+        fields = " ".join(f"{k}={v:.2f}" for k, v in sorted(row["fields"].items()))
+        mark = "*" if row["variant"] in front else " "
+        lines.append(f"{mark}{row['variant']:<35} {acc:>8} {row['mean_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                     f"{row['fps']:>7.1f}  {fields}")
+    lines.append("* = on the accuracy/time Pareto front")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score detector variants on labelled golden frames")
+    parser.add_argument("source", help="directory of images, video file or .npz of frames")
+    parser.add_argument("labels", help="labels JSON (see bench/golden.py)")
+    parser.add_argument("--variants", nargs="+", default=["city", "apriltag"],
+                        help="variants like city, city:scale=0.5, city:skip=2, race:LANE_ENGINE=histogram")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--save", help="write the report JSON here")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.labels, "r") as f:
+        label_file = json.load(f)
+    labels = label_file.get("frames", {})
+    steering_tolerance = label_file.get("steering_tolerance", 5)
+    corner_tolerance = label_file.get("corner_tolerance", 4.0)
+
+    frames = load_frames(args.source)
+    rows = [evaluate(spec, frames, labels, steering_tolerance, corner_tolerance, args.repeat)
+            for spec in args.variants]
+    front = pareto_front(rows)
+    print(format_report(rows, front))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"variants": rows, "pareto_front": front}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# =========================
+# bench/run.py
+# =========================
+# Offline benchmark for the vision detectors. Feeds a recorded frame set
+# through each detector headless, reports frames/s and per-stage latency,
+# and compares outputs and timing against a previous run:
+#
+#   cd python
+#   python -m bench.run recordings/track1 --save bench_baseline.json
+#   python -m bench.run recordings/track1 --baseline bench_baseline.json
+#
+# Lane engines are compared by running the same detector twice, e.g.
+#   python -m bench.run recordings/track1 --detectors race race:LANE_ENGINE=histogram
+# and for accuracy against labels, bench.golden with the same variants.
+import argparse
+import json
+import logging
+import sys
+import time
+
+from bench.frames import load_frames
+from bench.detectors import DETECTORS, make_detector, parse_variant
+from utils.profiler import Histogram, profiler
+
+logger = logging.getLogger(__name__)
+
+
+def _allocations():
+    return sum(n for name, n in profiler.counters.items() if name.endswith(".alloc"))
+
+
+def bench_detector(bench, frames, warmup=3, repeat=1, skip=1):
+    # warm caches (geometry, LSD/aruco init) on a throwaway instance
+    bench.setup()
+    prepared = [bench.prepare(frame) for _, frame in frames]
+    for frame in prepared[:warmup]:
+        bench.run(frame)
+    bench.teardown()
+
+    latency = Histogram()
+    outputs = []
+    total = 0.0
+    steady_allocs = 0
+    profiler.reset()
+    profiler.enabled = True
+    try:
+        for r in range(repeat):
+            bench.setup()
+            prepared = [bench.prepare(frame) for _, frame in frames]
+            out = None
+            start = time.perf_counter()
+            for i, ((name, _), frame) in enumerate(zip(frames, prepared)):
+                t0 = time.perf_counter()
+                # skipped frames reuse the last output, as a frame-skipping loop would
+                if out is None or i % skip == 0:
+                    out = bench.run(frame)
+                latency.record(time.perf_counter() - t0)
+                if r == 0:
+                    outputs.append(dict(frame=name, **out))
+                if i == 0:
+                    warm_allocs = _allocations()
+            total += time.perf_counter() - start
+            # buffer pools fill on the first frame; anything after is churn
+            steady_allocs += _allocations() - warm_allocs
+            bench.teardown()
+    finally:
+        profiler.enabled = False
+
+    count = len(frames) * repeat
+    return {
+        "frames": len(frames),
+        "fps": count / total if total > 0 else 0.0,
+        "latency": latency.summary(),
+        "stages": profiler.summary(),
+        "counters": dict(profiler.counters),
+        "steady_allocs": steady_allocs,
+        "outputs": outputs,
+    }
+
+
+def run_benchmark(source, detectors, limit=None, warmup=3, repeat=1):
+    frames = load_frames(source, limit=limit)
+    results = {"source": source, "frames": len(frames), "detectors": {}}
+    for spec in detectors:
+        skip = parse_variant(spec)[2]
+        logger.info(f"benchmarking {spec} on {len(frames)} frames")
+        results["detectors"][spec] = bench_detector(make_detector(spec), frames, warmup, repeat, skip)
+    return results
+
+
+def _outputs_match(cur, base, angle_tolerance):
+    for key, base_val in base.items():
+        if key == "frame":
+            continue
+        cur_val = cur.get(key)
+        if key == "steering_angle" and cur_val is not None and base_val is not None:
+            if abs(cur_val - base_val) > angle_tolerance:
+                return False
+        elif cur_val != base_val:
+            return False
+    return True
+
+
+def compare(current, baseline, max_regression=0.10, angle_tolerance=0):
+    """Return (report lines, regression flag) for current vs a stored run."""
+    lines = []
+    regressed = False
+    for name, cur in current["detectors"].items():
+        base = baseline.get("detectors", {}).get(name)
+        if base is None:
+            lines.append(f"{name}: no baseline")
+            continue
+
+        base_outputs = {o["frame"]: o for o in base.get("outputs", [])}
+        mismatches = [
+            o["frame"] for o in cur["outputs"]
+            if o["frame"] in base_outputs and not _outputs_match(o, base_outputs[o["frame"]], angle_tolerance)
+        ]
+        if mismatches:
+            regressed = True
+            lines.append(f"{name}: {len(mismatches)} frame(s) changed output, e.g. {mismatches[:5]}")
+
+        speed = cur["fps"] / base["fps"] - 1.0 if base["fps"] else 0.0
+        base_p95 = base["latency"].get("p95_ms", 0.0)
+        p95 = cur["latency"].get("p95_ms", 0.0) / base_p95 - 1.0 if base_p95 else 0.0
+        flag = ""
+        if speed < -max_regression or p95 > max_regression:
+            regressed = True
+            flag = "  <-- REGRESSION"
+        lines.append(f"{name}: fps {base['fps']:.1f} -> {cur['fps']:.1f} ({speed:+.1%}), "
+                     f"p95 {base_p95:.2f} -> {cur['latency'].get('p95_ms', 0.0):.2f} ms ({p95:+.1%}){flag}")
+    return lines, regressed
+
+
+def format_results(results):
+    lines = [f"{results['frames']} frames from {results['source']}"]
+    for name, res in results["detectors"].items():
+        lat = res["latency"]
+        lines.append(f"{name}: {res['fps']:.1f} fps, p50 {lat.get('p50_ms', 0):.2f} ms, "
+                     f"p95 {lat.get('p95_ms', 0):.2f} ms, p99 {lat.get('p99_ms', 0):.2f} ms, "
+                     f"steady-state buffer allocs {res.get('steady_allocs', 0)}")
+        for stage, s in res["stages"].items():
+            if s.get("count"):
+                lines.append(f"    {stage:<20} n={s['count']:<6} p50 {s['p50_ms']:.3f} ms  p95 {s['p95_ms']:.3f} ms")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark vision detectors on recorded frames")
+    parser.add_argument("source", help="directory of images, video file or .npz of frames")
+    parser.add_argument("--detectors", nargs="+", default=list(DETECTORS),
+                        help="detectors or variants like city:scale=0.5,skip=2 (default: all)")
+    parser.add_argument("--limit", type=int, default=None, help="use at most N frames")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=1, help="timed passes over the frame set")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed fractional fps drop / p95 increase")
+    parser.add_argument("--angle-tolerance", type=int, default=0,
+                        help="allowed steering_angle difference in degrees")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = run_benchmark(args.source, args.detectors, limit=args.limit, warmup=args.warmup, repeat=args.repeat)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.max_regression, args.angle_tolerance)
+        print("\n".join(lines))
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
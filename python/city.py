@@ -3,19 +3,23 @@ import config_city
 base_config.MODE="city"
 base_config.CONFIG_MODULE = config_city
 import os
-import json
+from utils.runtime_config import get_runtime_config, ConfigFileWatcher
+runtime_config = get_runtime_config(config_city)
+runtime_config.update({"DEBUG": False})
 if config_city.CHANGE_WITH_JSON:
     if os.path.exists("city.json"):
-        with open("city.json", "r") as f:
-            configs = json.loads(f.read())
-            for conf_name, value in configs.items():
-                setattr(config_city, conf_name, value)
+        runtime_config.load_json("city.json")
 from vision.camera import Camera
 from vision.city_vision_processing import VisionProcessor
 from vision.apriltag import ApriltagDetector
+from vision.traffic_light import TrafficLightDetector
+from vision.scheduler import DetectorScheduler
 from controller import controller
-from config_city import SPEED, default_height, default_width, SERVO_CENTER
-from stream import start_stream
+from controller.navigation import CityNavigator
+from utils.profiler import profiler
+from utils.buffer_pool import BufferPool, pooled
+from stream import start_stream, stop_stream
+from stream_process import StreamProcess
 import logging
 import cv2
 import time
@@ -24,71 +28,105 @@ import sys
 logging.disable(logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-config_city.DEBUG = False
-
 class Robot:
-    def __init__(self):
+    def __init__(self, stream_proc=None):
         self.camera = Camera()
         self.control = controller
+        self.config = runtime_config
+        # set when the stream runs in its own process (STREAM_PROCESS)
+        self.stream_proc = stream_proc
+        # stopping, crosswalk waits and tag maneuvers, advanced once per tick
+        self.nav = CityNavigator(self.control)
+        if self.config.snapshot().PULSE_TRACKING:
+            self.control.start_telemetry()
+        # resized frames are consumed within the tick, so one buffer serves all
+        self.buffers = BufferPool("frame_buffers")
 
         self.vision = VisionProcessor()
         self.apriltag_detector = ApriltagDetector()
-        self.crosswalk_time_start = 0
-        self.crosswalk_last_seen = 0
-        self.last_tag = None
-        self.stop_last_seen = None
-        
-    def check_crosswalk(self):
-        now = time.time()
-        if now - self.crosswalk_last_seen>= config_city.CROSSWALK_THRESH_SPEND:
-            # Only reset the crosswalk timer if it's not already running
-            self.crosswalk_time_start = now
-            self.crosswalk_last_seen = now
-
-        # If crosswalk timer is running, check for elapsed time
-        if self.crosswalk_time_start != 0:
-            elapsed = now - self.crosswalk_time_start
-            if elapsed >= config_city.CROSSWALK_SLEEP:
-                self.crosswalk_time_start = 0
-                logger.debug(f"navigate with tag: {self.last_tag}")
-                # Navigate based on last tag detected
-                if self.last_tag == 2:
-                     time.sleep(0.1)
-                     self.control.forward_pulse(f"f {SPEED} 5 90 f {SPEED} 4 140")
-                     time.sleep(0.1)
-                elif self.last_tag == 3:
-                    time.sleep(0.1)
-                    self.control.forward_pulse(f"f {SPEED} 6 90 f {SPEED} 4 60")
-                    time.sleep(0.1)
-                elif self.last_tag == 4:
-                    time.sleep(0.1)
-                    self.control.forward_pulse(f"f {SPEED} 9 95")
-                    time.sleep(0.1)
-                else:
-                    time.sleep(0.1)
-                    self.control.forward_pulse(f"f {SPEED}  10 95")
-                    time.sleep(0.1)
+
+        # lane steering runs every frame, the slower-changing detectors
+        # are scheduled and their last result reused in between
+        cfg = self.config.snapshot()
+        self.scheduler = DetectorScheduler(cfg.FRAME_BUDGET_MS, cfg.SCHEDULE_MAX_DEFER)
+        self.scheduler.add("crosswalk", self.vision.detect_crosswalk, every=cfg.CROSSWALK_EVERY,
+                           trigger=self.vision.crosswalk_trigger, default=False)
+        self.scheduler.add("apriltag", self.detect_tags, every=cfg.APRILTAG_EVERY, default=([], None))
+        # traffic lights run on their own thread on a copy of the tag frame:
+        # every N frames, every frame near an intersection
+        self.traffic_light_detector = TrafficLightDetector()
+        self.scheduler.add("traffic_light", self.detect_light, every=cfg.TRAFFIC_LIGHT_EVERY,
+                           trigger=lambda frame_at: self.near_intersection(), threaded=True)
+        self._schedule_version = cfg.version
         
+    def detect_tags(self, frame_at):
+        # detect() draws on frame_at in place; only the tags are cached
+        tags, _, largest_tag = self.apriltag_detector.detect(frame_at)
+        return tags, largest_tag
+
+    def detect_light(self, frame_at):
+        color, _ = self.traffic_light_detector.detect(frame_at)
+        return color
+
+    def near_intersection(self):
+        return self.nav.near_intersection(self.config.snapshot(), time.time())
+
+    def traffic_light(self, cfg, frame_at):
+        """Schedule a traffic light check; returns "RED"/"GREEN" if recently seen, else None."""
+        if not cfg.TRAFFIC_LIGHT:
+            return None
+        self.scheduler.run("traffic_light", frame_at)
+        color, age = self.scheduler.result("traffic_light")
+        if age is None or age[1] > cfg.TRAFFIC_LIGHT_MAX_AGE:
+            return None
+        return color
+
+    def show(self, frame):
+        """Hand a frame to the stream, here or in the stream process."""
+        if self.stream_proc is not None:
+            self.stream_proc.publish(frame)
+        else:
+            config_city.debug_frame_buffer = frame
+
+    def update_schedule(self, cfg):
+        if cfg.version == self._schedule_version:
+            return
+        self.scheduler.configure("crosswalk", cfg.CROSSWALK_EVERY)
+        self.scheduler.configure("apriltag", cfg.APRILTAG_EVERY)
+        self.scheduler.configure("traffic_light", cfg.TRAFFIC_LIGHT_EVERY)
+        self.scheduler.budget = cfg.FRAME_BUDGET_MS / 1000.0
+        self.scheduler.max_defer = cfg.SCHEDULE_MAX_DEFER
+        self._schedule_version = cfg.version
+
     def run(self):
         logger.info("starting")
         prev_time = time.time()
         try:
             while True:
+                # UI edits from the stream process land here, between ticks
+                if self.stream_proc is not None:
+                    self.stream_proc.poll()
+                # one config snapshot per tick; hot reloads land between ticks
+                cfg = self.config.snapshot()
+                self.update_schedule(cfg)
+                self.scheduler.begin_frame()
                 
-                if config_city.RUN_LVL == "STOP":
+                if cfg.RUN_LVL == "STOP":
                     time.sleep(0.01)
                     self.control.stop()
                     time.sleep(0.01)
-                    self.control.set_angle(SERVO_CENTER)
+                    self.control.set_angle(cfg.SERVO_CENTER)
                     time.sleep(0.01)
                     
                     frame_at = self.camera.capture_frame(resize=False)
 
-                    frame = cv2.resize(frame_at, (default_width, default_height), interpolation=cv2.INTER_AREA)
+                    with profiler.span("resize"):
+                        frame = cv2.resize(frame_at, (cfg.default_width, cfg.default_height), interpolation=cv2.INTER_AREA,
+                                           dst=pooled(self.buffers, "resized", (cfg.default_height, cfg.default_width, 3)))
 
                     result = self.vision.detect(frame)
                     
-                    if config_city.STREAM:
+                    if cfg.STREAM:
                         curr_time = time.time()
                         fps = 1.0 / (curr_time - prev_time)
                         prev_time = curr_time
@@ -96,43 +134,33 @@ class Robot:
                         display_frame = debug.get("combined").copy()
                         cv2.putText(display_frame, f"FPS: {fps:.1f}", (10, 30),
                                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        config_city.debug_frame_buffer = display_frame
+                        self.show(display_frame)
                     continue
                 
-                tag = False
-                if config_city.DEBUG:
+                if cfg.DEBUG:
                     cv2.waitKey(1)
-                angle=90
+                angle = None
                 crosswalk = False
-                
-                if self.crosswalk_time_start == 0: # 3 sec
-                    frame_at = self.camera.capture_frame(resize=False)
 
-                    frame = cv2.resize(frame_at, (default_width, default_height), interpolation=cv2.INTER_AREA)
+                frame_at = self.camera.capture_frame(resize=False)
+                if self.nav.driving:
+                    with profiler.span("resize"):
+                        frame = cv2.resize(frame_at, (cfg.default_width, cfg.default_height), interpolation=cv2.INTER_AREA,
+                                           dst=pooled(self.buffers, "resized", (cfg.default_height, cfg.default_width, 3)))
 
-                    result = self.vision.detect(frame)
+                    result = self.vision.detect(frame, with_crosswalk=False)
         
                     angle = result.get("steering_angle")
             
-                    crosswalk = result.get("crosswalk", False)
-                    
-                    tags, frame_at, largest_tag = self.apriltag_detector.detect(frame_at)
+                    crosswalk = self.scheduler.run("crosswalk", frame)
                     
-                    if largest_tag is not None:
-                        tag_id = largest_tag["id"]
-                        if largest_tag["corners"][1][1] > 180:  
-                            if tag_id == 5:
-                                    tag = True
-                                    self.stop_last_seen = time.time()
-
-                            self.last_tag = tag_id       
-                                      
-                    if tag or (self.stop_last_seen is not None and time.time() - self.stop_last_seen <= 1):
-                        self.control.stop()
-                        time.sleep(0.01)
-                        continue
+                    # before AprilTag, which draws on frame_at
+                    light = self.traffic_light(cfg, frame_at)
+
+                    tags, largest_tag = self.scheduler.run("apriltag", frame_at)
+                    self.nav.see_tag(largest_tag, cfg, time.time())
                 
-                    if config_city.DEBUG: 
+                    if cfg.DEBUG: 
                         debug = result.get("debug") or {}
                         if debug.get("combined") is not None:
                             cv2.imshow("combined", debug.get("combined"))
@@ -141,7 +169,7 @@ class Robot:
                         if frame_at is not None:
                             cv2.imshow("at", frame_at)
              
-                    if config_city.STREAM:
+                    if cfg.STREAM:
                         curr_time = time.time()
                         fps = 1.0 / (curr_time - prev_time)
                         prev_time = curr_time
@@ -149,28 +177,15 @@ class Robot:
                         display_frame = debug.get("combined").copy()
                         cv2.putText(display_frame, f"FPS: {fps:.1f}", (10, 30),
                                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        config_city.debug_frame_buffer = display_frame
+                        self.show(display_frame)
                     
-                else: # not 3 sec
-                    self.control.stop()
-                    time.sleep(0.1)
-                    frame_at = self.camera.capture_frame(resize=False)
-                    self.check_crosswalk()
-                    if config_city.STREAM:
-                        config_city.debug_frame_buffer = frame_at
-                    
-                    continue
-                
-                if crosswalk and time.time() - self.crosswalk_last_seen >= config_city.CROSSWALK_THRESH_SPEND:
-                    self.control.stop()
-                    time.sleep(0.1)
-                    self.check_crosswalk()
-                    continue
-                
-                self.control.set_angle(angle)
-                time.sleep(0.01)
-                self.control.set_speed(SPEED)  
-                time.sleep(0.01)
+                else:
+                    # stopped or maneuvering: no lane work, keep the light fresh
+                    light = self.traffic_light(cfg, frame_at)
+                    if cfg.STREAM:
+                        self.show(frame_at)
+
+                self.nav.step(cfg, angle, crosswalk, light)
 
         except KeyboardInterrupt:
             logger.error("error KeyboardInterrupt")
@@ -200,23 +215,32 @@ class Robot:
         _(self.camera.release)()
         _(self.control.connection.close)() # close serial connection
         
-        if config_city.DEBUG:
+        cfg = self.config.snapshot()
+        if cfg.DEBUG:
             _(cv2.destroyAllWindows)()
             
-        if config_city.STREAM:
-            try:
-                import requests
-                requests.post("http://127.0.0.1:5000/shutdown")
-            except Exception:
-                pass
-        
+        if self.stream_proc is not None:
+            _(self.stream_proc.stop)()
+        elif cfg.STREAM:
+            _(stop_stream)()
             if flask_thread.is_alive():
-                flask_thread.join()
+                flask_thread.join(2.0)
         sys.exit(0)
 
 if __name__ == '__main__':
+    if config_city.PROFILE:
+        profiler.enabled = True
+        profiler.dump_at_exit(config_city.PROFILE_DUMP_PATH)
+    stream_proc = None
     if config_city.STREAM:
-        flask_thread = threading.Thread(target=start_stream, daemon=False)
-        flask_thread.start()
-    robot = Robot()
+        if config_city.STREAM_PROCESS:
+            # forked, so before any other thread starts
+            stream_proc = StreamProcess(runtime_config, config_city.STREAM_FRAME_MAX).start()
+        else:
+            flask_thread = threading.Thread(target=start_stream, daemon=False)
+            flask_thread.start()
+    if config_city.CHANGE_WITH_JSON:
+        # hot-reload city.json edits; snapshots keep each frame consistent
+        ConfigFileWatcher(runtime_config, "city.json").start()
+    robot = Robot(stream_proc)
     robot.run()
\ No newline at end of file
@@ -7,6 +7,7 @@ default_width = 380
 default_height = 230
 CAMERA_PITCH_DEG = -40 # camera angle in real world
 CAMERA_HEIGHT = 27 # height of camera in real world
+CAMERA_HFOV_DEG = 62.2 # horizontal field of view (Pi Camera v2), used by IPM
 
 
 # Mode options: "picam" for Raspberry Pi Camera, "webcam" for USB camera
@@ -46,6 +47,12 @@ TL_TOP_ROI = 0.0
 TL_BOTTOM_ROI = 1
 TL_LEFT_ROI = 0.0
 TL_RIGHT_ROI = 1.0
+TL_MIN_AREA = 5 # px, smallest lamp blob
+TL_MIN_BRIGHTNESS = 180 # mean V (HSV) a lamp blob needs
+# HSV (lower, upper) ranges per lamp color, red wraps around hue 0
+TL_RED_RANGES = [[[0, 100, 100], [10, 255, 255]], [[170, 100, 100], [180, 255, 255]]]
+TL_GREEN_RANGES = [[[40, 50, 50], [90, 255, 255]]]
+TL_LUT_BITS = 5 # bits per BGR channel of the color lookup table (5 -> 32^3 entries)
 
 # --- Control Gains ---
 # These are proportional gains for steering correction
@@ -75,11 +82,38 @@ SPEED = 255
 # --- Crosswalk Setting ---
 CROSSWALK_SLEEP = 3 # sec  - after seeing crosswalk
 CROSSWALK_THRESH_SPEND = 8 # sec  - dont care if crosswalk seen before threshold time
+# LSD only runs when the thresholded CW ROI has enough edges for it to pass
+CROSSWALK_PREFILTER = True
+
+# --- Navigation ---
+# Tag seen before a crosswalk -> maneuver sent when the crosswalk wait ends
+# ({speed} is replaced by SPEED). Keys are strings so city.json can set them
+TAG_MANEUVERS = {
+    "2": "f {speed} 5 90 f {speed} 4 140",
+    "3": "f {speed} 6 90 f {speed} 4 60",
+    "4": "f {speed} 9 95",
+    "default": "f {speed} 10 95",
+}
+TAG_MIN_Y = 180 # px, a tag counts once its corner is this low in the frame
+STOP_TAG_ID = 5
+STOP_TAG_HOLD = 1 # sec the car stays stopped after last seeing the stop tag
+NAV_SETTLE_S = 0.1 # sec between stopping/reading a tag and the next command
+# Follow maneuvers through the Arduino's doing_hardcode telemetry: steering
+# is held back while the pulse groups run and lane following resumes when
+# they end (needs a sketch that sends status lines, main_nonBlocking.ino)
+PULSE_TRACKING = False
+PULSE_IDLE_REPORTS = 2 # idle status lines (100 ms apart) that end a maneuver
+PULSE_START_TIMEOUT_S = 0.5 # done if the busy flag never showed up by then
+PULSE_TIMEOUT_S = 10.0 # give up waiting for the telemetry
 
 
 # Stream (enable/disable) 
 STREAM = True
 debug_frame_buffer = None # global stream frame variable
+STREAM_SERVER = "flask" # "flask": thread per connection, "async": one aiohttp event loop (needs aiohttp)
+STREAM_MAX_CONCURRENCY = 8 # threads the async server runs views on (more requests queue)
+STREAM_PROCESS = False # serve the stream from its own process (frames through shared memory)
+STREAM_FRAME_MAX = (720, 1280, 3) # largest frame the shared memory slot holds
 
 # Lane Width (distance between two lane in the track)
 LANE_WIDTH = 30 # cm
@@ -93,4 +127,59 @@ RUN_LVL = "MOVE" # it can be MOVE or STOP
 
 
 # Change Configs based on json file
-CHANGE_WITH_JSON = False
\ No newline at end of file
+CHANGE_WITH_JSON = False
+
+# --- Profiling ---
+PROFILE = False # record stage timings, served on /profile by the stream
+PROFILE_DUMP_PATH = "profile.json" # summary written here at exit
+
+# --- Lane Tracking ---
+# Kalman filter per lane: gates Hough segments around the predicted lane
+# and coasts through short dropouts
+LANE_TRACKING = False
+LANE_TRACK_MAX_COAST = 5 # frames a lane is predicted without being seen
+LANE_TRACK_PROCESS_NOISE = 4.0 # px/frame^2, how fast the lane may move
+LANE_TRACK_MEASUREMENT_NOISE = 6.0 # px, noise of one Hough measurement
+LANE_TRACK_GATE_SIGMA = 3.0 # gate half-width in standard deviations
+LANE_TRACK_MIN_GATE = 10 # px
+LANE_TRACK_MAX_GATE = 80 # px
+
+# --- Adaptive ROI ---
+# Needs LANE_TRACKING. While a lane is tracked confidently, only a band
+# around its predicted x is thresholded/Canny'd/Hough'd
+ADAPTIVE_ROI = False
+ADAPTIVE_ROI_MIN_CONFIDENCE = 0.25 # tracker.confidence after predict, ~0.3 when locked on
+ADAPTIVE_ROI_MARGIN = 10 # px added on each side of the tracking gate
+
+# --- Lane Engine ---
+# "hough": threshold + Canny + HoughLinesP per lane ROI
+# "histogram": threshold + column histogram + sliding windows per lane ROI
+# "ipm": bird's-eye warp of the bottom band + column histogram
+LANE_ENGINE = "hough"
+HIST_WINDOWS = 4 # sliding windows stacked over the ROI height
+HIST_MARGIN = 15 # px, half-width of a window
+HIST_MIN_PIXELS = 10 # white pixels needed to (re)centre a window
+IPM_TOP_ROI = 0.6 # warp rows from here (fraction of height) to the bottom
+IPM_LATERAL = 40 # cm covered each side of the camera axis
+IPM_MAX_DISTANCE = 200 # cm, cap for rows near the horizon
+IPM_WIDTH = 160 # bird's-eye image size in pixels
+IPM_HEIGHT = 120
+IPM_MIN_PEAK = 15 # white pixels a histogram column needs to count as a lane
+
+# --- Detector Scheduling ---
+# Lane steering runs every frame. Crosswalk and AprilTag detection run
+# every N frames, at once when their cheap trigger fires, and are put off
+# (at most SCHEDULE_MAX_DEFER frames) once a frame has used FRAME_BUDGET_MS
+CROSSWALK_EVERY = 3
+CROSSWALK_TRIGGER_RATIO = 0.15 # bright-pixel share in the CW ROI that forces a check (0 = off)
+APRILTAG_EVERY = 2
+FRAME_BUDGET_MS = 0 # 0 = no budget
+SCHEDULE_MAX_DEFER = 5
+
+# --- Traffic Light ---
+# Red stops the car near an intersection and holds it at a crosswalk,
+# green releases a crosswalk stop early
+TRAFFIC_LIGHT = False
+TRAFFIC_LIGHT_EVERY = 10 # frames between checks away from intersections
+TRAFFIC_LIGHT_NEAR_S = 2.0 # sec after a crosswalk/tag sighting that counts as near an intersection
+TRAFFIC_LIGHT_MAX_AGE = 1.0 # sec, older results are ignored
@@ -65,10 +65,37 @@ CROSSWALK_THRESH_SPEND = 10
 # Stream (enable/disable) 
 STREAM = True
 debug_frame_buffer = None # global stream frame variable
+STREAM_SERVER = "flask" # "flask": thread per connection, "async": one aiohttp event loop (needs aiohttp)
+STREAM_MAX_CONCURRENCY = 8 # threads the async server runs views on (more requests queue)
 
 # Static Threshold
 LANE_THRESHOLD = 180 # lane vision processing threshold
 CROSSWALK_THRESHOLD = 180 
 
 # Run Level
-RUN_LVL = "MOVE" # it can be MOVE or STOP
\ No newline at end of file
+RUN_LVL = "MOVE" # it can be MOVE or STOP
+
+
+# Change Configs based on json file
+CHANGE_WITH_JSON = False
+
+# --- Profiling ---
+PROFILE = False # record stage timings, served on /profile by the stream
+PROFILE_DUMP_PATH = "profile.json" # summary written here at exit
+
+# --- Lane Engine ---
+# "hough": threshold + Canny + HoughLinesP per lane ROI
+# "histogram": threshold + column histogram + sliding windows
+# "curve": quadratic fit over a taller band, steering from a look-ahead row
+LANE_ENGINE = "hough"
+HIST_WINDOWS = 4 # sliding windows stacked over the ROI height
+HIST_MARGIN = 15 # px, half-width of a window
+HIST_MIN_PIXELS = 10 # white pixels needed to (re)centre a window
+
+# --- Lane Curve ---
+CURVE_TOP_ROI = 0.55 # curve band starts here (fraction of height), ends at the lane ROI bottom
+CURVE_LOOKAHEAD_ROI = 0.7 # steer towards the lane at this row (fraction of height)
+CURVE_WINDOWS = 6 # sliding windows for the first fit
+CURVE_MARGIN = 15 # px around the previous curve searched for lane pixels
+CURVE_MIN_PIXELS = 40 # fewer lane pixels than this drops the curve
+CURVE_SMOOTHING = 0.05 # pull towards last frame's curve, 0 = independent fits
@@ -1,5 +1,9 @@
 import time
+import threading
+import logging
 from utils.arduino_connection import ArduinoConnection
+from utils.profiler import profiler
+from utils.runtime_config import get_runtime_config
 import base_config as temp_conf
 
 if temp_conf.CONFIG_MODULE is not None:
@@ -7,17 +11,132 @@ if temp_conf.CONFIG_MODULE is not None:
 else:
     conf = temp_conf
 
+logger = logging.getLogger(__name__)
+
+
+class PulseManeuver:
+    """
+        Tracks one forward_pulse/backward_pulse command ("f 255 5 90 f 255 4 140"
+        is two groups) through the doing_hardcode telemetry flag. The Arduino
+        drops the flag between groups only for a moment, so the maneuver is
+        done once the flag fell once per group, or stayed down for
+        idle_reports reports after it was seen up.
+    """
+    def __init__(self, command, idle_reports=2):
+        self.command = command
+        self.groups = max(1, len(command.split()) // 4)
+        self.idle_reports = idle_reports
+        self.started = time.time()
+        self.finished = None
+        self.busy_seen = False
+        self.busy = False
+        self.falls = 0
+        self.idle = 0
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def update(self, busy):
+        if self.done:
+            return
+        if busy:
+            self.busy_seen = True
+            self.idle = 0
+        else:
+            if self.busy:
+                self.falls += 1
+            self.idle += 1
+            if self.falls >= self.groups or (self.busy_seen and self.idle >= self.idle_reports):
+                self.finished = time.time()
+        self.busy = busy
+
+    def expire(self, timeout, start_timeout):
+        # never saw the flag (pulses shorter than a report) or lost telemetry
+        elapsed = time.time() - self.started
+        if not self.done and (elapsed >= timeout or (not self.busy_seen and self.idle and elapsed >= start_timeout)):
+            self.finished = time.time()
+
+
 class RobotController:
     def __init__(self):
         self.connection = ArduinoConnection()
+        # PULSE_* come from here, so UI edits and hot reloads apply
+        self.config = get_runtime_config(conf)
         self.current_angle = 90
         self.current_speed = 0
+        self.telemetry = {}
+        self.maneuver = None
+        self.suppressed = 0
+        self._telemetry_thread = None
+
+    # --- Pulse maneuvers ---
+    def start_telemetry(self):
+        """Read Arduino status lines on a thread; enables maneuver tracking."""
+        if self._telemetry_thread is None:
+            self._telemetry_thread = threading.Thread(target=self._telemetry_loop, name="telemetry", daemon=True)
+            self._telemetry_thread.start()
+
+    def _telemetry_loop(self):
+        backoff = 0.1
+        while not self.connection.closed:
+            try:
+                data = self.read()
+            except Exception:
+                logger.exception("telemetry read failed")
+                time.sleep(0.1)
+                continue
+            if not data:
+                # without a port read_command() returns at once; an open
+                # port blocks in readline() until its timeout instead
+                if not self.connection.is_open:
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 1.0)
+                continue
+            backoff = 0.1
+            self.telemetry = data
+            maneuver = self.maneuver
+            if maneuver is not None:
+                maneuver.update(data["doing_hardcode"])
+
+    @property
+    def tracking(self):
+        return self._telemetry_thread is not None
+
+    @property
+    def maneuver_running(self):
+        maneuver = self.maneuver
+        if maneuver is None or not self.tracking:
+            return False
+        cfg = self.config.snapshot()
+        maneuver.expire(cfg.get("PULSE_TIMEOUT_S", 10.0), cfg.get("PULSE_START_TIMEOUT_S", 0.5))
+        if maneuver.done:
+            profiler.count("controller.maneuvers")
+            self.maneuver = None
+            return False
+        return True
+
+    def _track(self, command):
+        if self.tracking:
+            self.maneuver = PulseManeuver(command.strip(), self.config.get("PULSE_IDLE_REPORTS", 2))
+
+    def _steering_blocked(self):
+        # the sketch still applies servo/motor lines mid-maneuver, which
+        # would bend or cut the pulse groups; drop them until it is done
+        if self.maneuver_running:
+            self.suppressed += 1
+            profiler.count("controller.suppressed")
+            return True
+        return False
 
     def _send_command(self, cmd: str):
         cmd = cmd.strip() + "\n" 
-        self.connection.send_command(cmd)
+        with profiler.span("serial_write"):
+            self.connection.send_command(cmd)
 
     def servo(self, angle: int):
+        if self._steering_blocked():
+            return
         if angle < conf.MIN_SERVO_ANGLE:
             angle = conf.MIN_SERVO_ANGLE
         elif angle > conf.MAX_SERVO_ANGLE:
@@ -26,6 +145,8 @@ class RobotController:
         self._send_command(f"servo {angle}")
 
     def motor(self, speed: int):
+        if self._steering_blocked():
+            return
         if speed > 255:
             speed = 255
         elif speed < -255:
@@ -37,6 +158,8 @@ class RobotController:
 
     def stop(self):
         """Stop the robot"""
+        # the Arduino clears its pulse queue on stop
+        self.maneuver = None
         self._send_command("stop")
         self.current_speed = 0
 
@@ -58,9 +181,11 @@ class RobotController:
         
     def forward_pulse(self,s):
         self._send_command(s)
+        self._track(s)
     
     def backward_pulse(self, s):
         self._send_command(s)
+        self._track(s)
         
         
     def read(self):
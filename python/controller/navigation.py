@@ -0,0 +1,139 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# used when a (hot-reloaded) TAG_MANEUVERS has no usable "default"
+DEFAULT_MANEUVER = "f {speed} 10 95"
+
+# --- States ---
+DRIVING = "DRIVING"
+STOPPING = "STOPPING"
+WAITING_AT_CROSSWALK = "WAITING_AT_CROSSWALK"
+READING_TAG = "READING_TAG"
+EXECUTING_MANEUVER = "EXECUTING_MANEUVER"
+
+
+class CityNavigator:
+    """
+        Crosswalk / stop tag / traffic light handling for the city loop as a
+        state machine. step() is called once per tick and never sleeps:
+
+          DRIVING --crosswalk--> STOPPING --settled--> WAITING_AT_CROSSWALK
+            --CROSSWALK_SLEEP or green--> READING_TAG --settled-->
+            EXECUTING_MANEUVER --pulses done--> DRIVING
+
+        A close stop tag or a red light near an intersection also stops the
+        car (STOPPING) until the cause clears, then it drives on.
+    """
+    def __init__(self, control):
+        self.control = control
+        self.state = DRIVING
+        self.state_since = time.time()
+        self.reason = None # why STOPPING: "crosswalk", "stop_tag" or "red_light"
+        self.last_tag = None
+        self.maneuver = None
+        self.crosswalk_last_seen = 0
+        self.tag_last_seen = 0
+        self.stop_last_seen = None
+
+    @property
+    def driving(self):
+        return self.state == DRIVING
+
+    def _enter(self, state, now, reason=None):
+        logger.debug(f"{self.state} -> {state} ({reason})")
+        self.state = state
+        self.state_since = now
+        self.reason = reason
+
+    def see_tag(self, largest_tag, cfg, now):
+        if largest_tag is None:
+            return
+        self.tag_last_seen = now
+        # only tags close enough (low in the frame) count
+        if largest_tag["corners"][1][1] > cfg.TAG_MIN_Y:
+            if largest_tag["id"] == cfg.STOP_TAG_ID:
+                self.stop_last_seen = now
+            self.last_tag = largest_tag["id"]
+
+    def near_intersection(self, cfg, now):
+        return (self.state != DRIVING
+                or now - self.crosswalk_last_seen <= cfg.TRAFFIC_LIGHT_NEAR_S
+                or now - self.tag_last_seen <= cfg.TRAFFIC_LIGHT_NEAR_S)
+
+    def _stop_cause(self, cfg, now, light):
+        if self.stop_last_seen is not None and now - self.stop_last_seen <= cfg.STOP_TAG_HOLD:
+            return "stop_tag"
+        if light == "RED" and self.near_intersection(cfg, now):
+            return "red_light"
+        return None
+
+    def step(self, cfg, angle=None, crosswalk=False, light=None, now=None):
+        """Advance one tick and send this tick's commands."""
+        now = time.time() if now is None else now
+
+        if self.state == DRIVING:
+            cause = self._stop_cause(cfg, now, light)
+            if cause is not None:
+                self._enter(STOPPING, now, cause)
+            elif crosswalk and now - self.crosswalk_last_seen >= cfg.CROSSWALK_THRESH_SPEND:
+                self.crosswalk_last_seen = now
+                self._enter(STOPPING, now, "crosswalk")
+            else:
+                if angle is not None:
+                    self.control.set_angle(angle)
+                self.control.set_speed(cfg.SPEED)
+                return
+
+        if self.state == STOPPING:
+            self.control.stop()
+            if self.reason == "crosswalk":
+                if now - self.state_since >= cfg.NAV_SETTLE_S:
+                    self._enter(WAITING_AT_CROSSWALK, now)
+            elif self._stop_cause(cfg, now, light) is None:
+                self._enter(DRIVING, now)
+
+        elif self.state == WAITING_AT_CROSSWALK:
+            self.control.stop()
+            # a red light holds the car at the crosswalk, a green one
+            # releases it without waiting out CROSSWALK_SLEEP
+            if light != "RED" and (now - self.state_since >= cfg.CROSSWALK_SLEEP or light == "GREEN"):
+                self._enter(READING_TAG, now)
+
+        elif self.state == READING_TAG:
+            if now - self.state_since >= cfg.NAV_SETTLE_S:
+                logger.debug(f"navigate with tag: {self.last_tag}")
+                self.maneuver = self._maneuver_for(cfg, self.last_tag)
+                self.control.forward_pulse(self.maneuver)
+                self._enter(EXECUTING_MANEUVER, now)
+
+        elif self.state == EXECUTING_MANEUVER:
+            # with telemetry the controller reports when the pulse groups are
+            # done and lane following resumes right away; without it, wait
+            # NAV_SETTLE_S and let the sketch finish the queue on its own
+            if self.control.tracking:
+                done = not self.control.maneuver_running
+            else:
+                done = now - self.state_since >= cfg.NAV_SETTLE_S
+            if done:
+                self.maneuver = None
+                self._enter(DRIVING, now)
+
+    def _maneuver_for(self, cfg, tag):
+        maneuvers = cfg.TAG_MANEUVERS if isinstance(cfg.TAG_MANEUVERS, dict) else {}
+        template = maneuvers.get(str(tag), maneuvers.get("default", DEFAULT_MANEUVER))
+        try:
+            return template.format(speed=cfg.SPEED)
+        except (AttributeError, KeyError, IndexError, ValueError):
+            logger.warning(f"bad TAG_MANEUVERS entry for tag {tag}: {template!r}")
+            return DEFAULT_MANEUVER.format(speed=cfg.SPEED)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "since": self.state_since,
+            "reason": self.reason,
+            "last_tag": self.last_tag,
+            "maneuver": self.maneuver,
+        }
@@ -2,20 +2,23 @@ from vision.camera import Camera
 from vision.vision_processing import VisionProcessor
 from vision.apriltag import ApriltagDetector
 from controller import RobotController
-from base_config import SPEED, CROSSWALK_SLEEP, CROSSWALK_THRESH_SPEND
+from utils.profiler import profiler
 import base_config
+from utils.runtime_config import get_runtime_config
 import logging
 import cv2
 import time
 logging.disable(logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-base_config.DEBUG = False
+runtime_config = get_runtime_config(base_config)
+runtime_config.update({"DEBUG": False})
 
 class Robot:
     def __init__(self):
         self.camera = Camera()
         self.control = RobotController()
+        self.config = runtime_config
 
         self.vision = VisionProcessor()
         self.apriltag_detector = ApriltagDetector()
@@ -23,9 +26,10 @@ class Robot:
         self.crosswalk_last_seen = 0
         self.last_tag = None
         
-    def check_crosswalk(self, frame):
+    def check_crosswalk(self, frame, cfg):
+        SPEED = cfg.SPEED
         now = time.time()
-        if now - self.crosswalk_last_seen>= CROSSWALK_THRESH_SPEND:
+        if now - self.crosswalk_last_seen>= cfg.CROSSWALK_THRESH_SPEND:
             # Only reset the crosswalk timer if it's not already running
             self.crosswalk_time_start = now
             self.crosswalk_last_seen = now
@@ -34,7 +38,7 @@ class Robot:
         # If crosswalk timer is running, check for elapsed time
         if self.crosswalk_time_start != 0:
             elapsed = now - self.crosswalk_time_start
-            if elapsed >= CROSSWALK_SLEEP:
+            if elapsed >= cfg.CROSSWALK_SLEEP:
                 self.crosswalk_time_start = 0
            
                 # Navigate based on last tag detected
@@ -74,7 +78,8 @@ class Robot:
         logger.info("starting")
         try:
             while True:
-                if config_race.DEBUG:
+                cfg = self.config.snapshot()
+                if cfg.DEBUG:
                     cv2.waitKey(1)
                 angle=90
                 crosswalk = False
@@ -86,7 +91,7 @@ class Robot:
                     angle = result.get("steering_angle")
             
                     crosswalk = result.get("crosswalk", False)
-                    if config_race.DEBUG:
+                    if cfg.DEBUG:
                         debug = result.get("debug") or {}
                         if debug.get("combined") is not None:
                             cv2.imshow("combined", debug.get("combined"))
@@ -96,17 +101,17 @@ class Robot:
                 else: # not 3 sec
                     frame = self.camera.capture_frame(resize=False)
                     self.control.stop()
-                    self.check_crosswalk(frame)
+                    self.check_crosswalk(frame, cfg)
                     continue
                 
-                if crosswalk and time.time() - self.crosswalk_last_seen >= CROSSWALK_THRESH_SPEND:
-                    self.check_crosswalk(frame)
+                if crosswalk and time.time() - self.crosswalk_last_seen >= cfg.CROSSWALK_THRESH_SPEND:
+                    self.check_crosswalk(frame, cfg)
                     self.control.stop()
                     continue
                 
                 self.control.set_angle(angle)
                 time.sleep(0.01)
-                self.control.set_speed(SPEED)  
+                self.control.set_speed(cfg.SPEED)  
                 time.sleep(0.01)
 
         except KeyboardInterrupt:
@@ -126,5 +131,8 @@ class Robot:
         
 
 if __name__ == '__main__':
+    if base_config.PROFILE:
+        profiler.enabled = True
+        profiler.dump_at_exit(base_config.PROFILE_DUMP_PATH)
     robot = Robot()
     robot.run()
\ No newline at end of file
@@ -2,24 +2,33 @@ import base_config
 import config_race
 base_config.MODE="race"
 base_config.CONFIG_MODULE = config_race
+import os
+from utils.runtime_config import get_runtime_config, ConfigFileWatcher
+runtime_config = get_runtime_config(config_race)
+runtime_config.update({"DEBUG": True})
+if config_race.CHANGE_WITH_JSON:
+    if os.path.exists("race.json"):
+        runtime_config.load_json("race.json")
 
 from vision.camera import Camera
 from vision.race_vision_processing import VisionProcessor
 from vision.apriltag import ApriltagDetector
 from controller import controller
-from config_race import SPEED, default_height, default_width
+from utils.profiler import profiler
+from utils.buffer_pool import BufferPool, pooled
 import logging
 import cv2
 import time
 logging.disable(logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-config_race.DEBUG = True
-
 class Robot:
     def __init__(self):
         self.camera = Camera()
         self.control = controller
+        self.config = runtime_config
+        # resized frames are consumed within the tick, so one buffer serves all
+        self.buffers = BufferPool("frame_buffers")
         self.vision = VisionProcessor()
         self.apriltag_detector = ApriltagDetector()
         self.stop_last_seen = None
@@ -29,12 +38,16 @@ class Robot:
         try:
             
             while True:
+                # one config snapshot per tick; hot reloads land between ticks
+                cfg = self.config.snapshot()
                 tag = False
-                if config_race.DEBUG:
+                if cfg.DEBUG:
                     cv2.waitKey(1)
                 frame_at = self.camera.capture_frame(resize=False)
             
-                frame = cv2.resize(frame_at, (default_width, default_height), interpolation=cv2.INTER_AREA)
+                with profiler.span("resize"):
+                    frame = cv2.resize(frame_at, (cfg.default_width, cfg.default_height), interpolation=cv2.INTER_AREA,
+                                       dst=pooled(self.buffers, "resized", (cfg.default_height, cfg.default_width, 3)))
                 
                 result = self.vision.detect(frame)                
                 
@@ -60,7 +73,7 @@ class Robot:
                                     
                                         pass                         
                                     
-                if config_race.DEBUG:
+                if cfg.DEBUG:
                     debug = result.get("debug") or {}
                     if debug.get("combined") is not None:
                         cv2.imshow("combined", debug.get("combined"))
@@ -78,7 +91,7 @@ class Robot:
                 
                 self.control.set_angle(angle)
                 time.sleep(0.01)
-                self.control.set_speed(SPEED)  
+                self.control.set_speed(cfg.SPEED)  
                 time.sleep(0.01)
 
         except KeyboardInterrupt:
@@ -101,5 +114,10 @@ class Robot:
         cv2.destroyAllWindows()
 
 if __name__ == '__main__':
+    if config_race.PROFILE:
+        profiler.enabled = True
+        profiler.dump_at_exit(config_race.PROFILE_DUMP_PATH)
+    if config_race.CHANGE_WITH_JSON:
+        ConfigFileWatcher(runtime_config, "race.json").start()
     robot = Robot()
     robot.run()
\ No newline at end of file
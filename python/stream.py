@@ -7,6 +7,9 @@ import os
 from flask import Flask, Response, request, render_template_string, jsonify
 import threading
 import base_config as temp_conf
+from utils.runtime_config import get_runtime_config, save_json_atomic
+from vision.roi_geometry import geometry_cache
+from utils.profiler import profiler
 
 # choose config module
 if temp_conf.CONFIG_MODULE is not None:
@@ -17,6 +20,17 @@ else:
 logger = logging.getLogger(__name__)
 stop_event = threading.Event()
 app = Flask(__name__)
+_server = None
+
+# --- Out-of-process hooks ---
+# stream_process sets these when the server runs in its own process;
+# in-process they read the drive loop's state directly
+def _local_frame():
+    return getattr(conf, "debug_frame_buffer", None)
+
+frame_source = _local_frame # returns the frame to show
+loop_sink = None # loop_sink(kind, payload) forwards an edit to the drive loop
+remote_status = None # {"roi_geometry", "profile"} last pushed by the drive loop
 
 # --- ROI variable names ---
 VARIABLES = [
@@ -80,11 +94,16 @@ def save_conf_to_json():
         "RUN_LVL": getattr(conf, "RUN_LVL", ADVANCED_VARS["RUN_LVL"]),
     })
     try:
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=2)
+        save_json_atomic(filename, data)
     except Exception:
         logger.exception("Failed writing config JSON")
 
+def apply_config(updated):
+    get_runtime_config(conf).update(updated)
+    save_conf_to_json()
+    if loop_sink is not None:
+        loop_sink("config", updated)
+
 # --- HTML template (full UI) ---
 HTML_TEMPLATE = """
 <!doctype html>
@@ -756,12 +775,11 @@ def update_conf():
             try:
                 val = float(data[var])
                 val = max(0.0, min(1.0, val))
-                setattr(conf, var, val)
                 updated[var] = val
             except (ValueError, TypeError):
                 pass
     if updated:
-        save_conf_to_json()
+        apply_config(updated)
     return jsonify(success=True, values={var: float(getattr(conf, var, 0.0)) for var in VARIABLES})
 
 @app.route('/set_variable', methods=['POST'])
@@ -774,8 +792,7 @@ def set_variable():
         return jsonify(success=False, error="invalid value"), 400
     val = max(0.0, min(1.0, val))
     if var in VARIABLES:
-        setattr(conf, var, val)
-        save_conf_to_json()
+        apply_config({var: val})
         return jsonify(success=True, variable=var, value=val)
     return jsonify(success=False, error="unknown variable"), 400
 
@@ -783,6 +800,27 @@ def set_variable():
 def get_values():
     return jsonify(values={var: float(getattr(conf, var, 0.0)) for var in VARIABLES})
 
+# pixel ROI bounds the detectors actually used on the last frame
+@app.route('/roi_geometry')
+def roi_geometry():
+    if remote_status is not None:
+        return jsonify(geometry=remote_status.get("roi_geometry", {}))
+    return jsonify(geometry=geometry_cache.latest())
+
+# stage timings (p50/p95/p99 per span) when PROFILE is enabled
+@app.route('/profile')
+def profile():
+    if remote_status is not None:
+        return jsonify(**remote_status.get("profile", {"enabled": False, "spans": {}, "counters": {}}))
+    return jsonify(enabled=profiler.enabled, spans=profiler.summary(), counters=profiler.counters)
+
+@app.route('/profile/reset', methods=['POST'])
+def profile_reset():
+    if loop_sink is not None:
+        loop_sink("profile_reset", None)
+    profiler.reset()
+    return jsonify(success=True)
+
 # Advanced endpoints
 @app.route('/get_advanced')
 def get_advanced():
@@ -803,26 +841,26 @@ def set_advanced():
         if "LANE_THRESHOLD" in data:
             val = int(data["LANE_THRESHOLD"])
             val = max(0, min(255, val))
-            setattr(conf, "LANE_THRESHOLD", val); updated["LANE_THRESHOLD"] = val
+            updated["LANE_THRESHOLD"] = val
         if "CROSSWALK_THRESHOLD" in data:
             val = int(data["CROSSWALK_THRESHOLD"])
             val = max(0, min(255, val))
-            setattr(conf, "CROSSWALK_THRESHOLD", val); updated["CROSSWALK_THRESHOLD"] = val
+            updated["CROSSWALK_THRESHOLD"] = val
         if "CROSSWALK_SLEEP" in data:
             val = float(data["CROSSWALK_SLEEP"])
-            setattr(conf, "CROSSWALK_SLEEP", val); updated["CROSSWALK_SLEEP"] = val
+            updated["CROSSWALK_SLEEP"] = val
         if "CROSSWALK_THRESH_SPEND" in data:
             val = float(data["CROSSWALK_THRESH_SPEND"])
-            setattr(conf, "CROSSWALK_THRESH_SPEND", val); updated["CROSSWALK_THRESH_SPEND"] = val
+            updated["CROSSWALK_THRESH_SPEND"] = val
         if "RUN_LVL" in data:
             val = data["RUN_LVL"] if data["RUN_LVL"] in ("MOVE","STOP") else "MOVE"
-            setattr(conf, "RUN_LVL", val); updated["RUN_LVL"] = val
+            updated["RUN_LVL"] = val
     except Exception as e:
         logger.exception("Invalid advanced payload")
         return jsonify(success=False, error="invalid payload"), 400
 
     if updated:
-        save_conf_to_json()
+        apply_config(updated)
     advanced_current = {
         "LANE_THRESHOLD": int(getattr(conf, "LANE_THRESHOLD", ADVANCED_VARS["LANE_THRESHOLD"])),
         "CROSSWALK_THRESHOLD": int(getattr(conf, "CROSSWALK_THRESHOLD", ADVANCED_VARS["CROSSWALK_THRESHOLD"])),
@@ -854,27 +892,51 @@ def set_ui():
     return jsonify(success=True, ui=UI_SETTINGS)
 
 # video feed (single frame endpoint used by UI)
+# (frame, jpeg) of the last encode: every viewer polling the same debug
+# frame gets the same bytes, so viewers don't add encodes
+_last_jpeg = (None, None)
+
 @app.route('/video_feed_frame')
 def video_feed_frame():
-    frame = getattr(conf, "debug_frame_buffer", None)
+    global _last_jpeg
+    frame = frame_source()
     if frame is None:
         return Response('', status=204)
-    ret, buffer = cv2.imencode('.jpg', frame)
-    if not ret:
-        return Response('', status=204)
-    return Response(buffer.tobytes(), mimetype='image/jpeg')
+    cached_frame, jpeg = _last_jpeg
+    if cached_frame is not frame:
+        with profiler.span("jpeg_encode"):
+            ret, buffer = cv2.imencode('.jpg', frame)
+        if not ret:
+            return Response('', status=204)
+        jpeg = buffer.tobytes()
+        _last_jpeg = (frame, jpeg)
+    return Response(jpeg, mimetype='image/jpeg')
 
 @app.route("/shutdown", methods=["POST"])
 def shutdown_route():
-    stop_event.set()
-    func = request.environ.get('werkzeug.server.shutdown')
-    if func:
-        func()
+    # shutdown() waits for the serve loop, so not from the request thread
+    threading.Thread(target=stop_stream, daemon=True).start()
     logger.debug("Server shutting down...")
     return "Server shutting down..."
 
 def start_stream():
-    app.run(host='0.0.0.0', port=5000, threaded=True, debug=False)
+    """Blocking; returns after stop_stream()."""
+    global _server
+    if getattr(conf, "STREAM_SERVER", "flask") == "async":
+        # one event loop thread instead of a thread per connection
+        from utils.async_http import AsyncWsgiServer
+        AsyncWsgiServer(app, '0.0.0.0', 5000, getattr(conf, "STREAM_MAX_CONCURRENCY", 8), stop_event).run()
+        return
+    from werkzeug.serving import make_server
+    _server = make_server('0.0.0.0', 5000, app, threaded=True)
+    if stop_event.is_set():
+        return
+    _server.serve_forever()
+
+def stop_stream():
+    stop_event.set()
+    if _server is not None:
+        _server.shutdown()
 
 if __name__ == '__main__':
     start_stream()
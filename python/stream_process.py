@@ -0,0 +1,171 @@
+# stream_process.py
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+from utils.frame_bus import FrameBus
+from utils.profiler import profiler
+from vision.roi_geometry import geometry_cache
+
+logger = logging.getLogger(__name__)
+
+# config values that can cross the status pipe
+_PLAIN = (bool, int, float, str, list, tuple, dict, type(None))
+_MISSING = object()
+
+
+def _plain_values(cfg):
+    return {k: v for k, v in cfg.as_dict().items() if isinstance(v, _PLAIN)}
+
+
+class StreamProcess:
+    """
+        Runs the tuning stream (stream.py) in its own process, so JPEG
+        encoding, template rendering and request handling don't take the
+        GIL from the drive loop.
+
+          drive loop --FrameBus (shared memory)--> stream   debug frame
+          drive loop --status pipe, ~1 Hz--------> stream   config, ROI geometry, profile
+          stream --edit pipe---------------------> drive loop   UI config edits
+
+        The drive loop calls publish() and poll() once per tick; neither
+        waits on the stream process. Uses fork, so start it before any
+        other thread is running.
+    """
+    def __init__(self, runtime, max_shape, status_interval=1.0):
+        self.runtime = runtime
+        self.status_interval = status_interval
+        ctx = multiprocessing.get_context("fork")
+        self.bus = FrameBus(max_shape)
+        self.edits, edits_send = ctx.Pipe(duplex=False)
+        status_recv, self.status = ctx.Pipe(duplex=False)
+        self.stop_event = ctx.Event()
+        self.process = ctx.Process(target=_serve, name="stream", daemon=True,
+                                   args=(self.bus.name, edits_send, status_recv, self.stop_event))
+        self._status_at = 0.0
+        # the forked stream process starts with this config; later pushes
+        # carry only what changed since, so a push in flight never
+        # carries back an older value of a key the UI just edited
+        cfg = runtime.snapshot()
+        self._config_version = cfg.version
+        self._sent_config = _plain_values(cfg)
+
+    def start(self):
+        self.process.start()
+        logger.info(f"stream process pid {self.process.pid}")
+        return self
+
+    def publish(self, frame):
+        with profiler.span("frame_bus.publish"):
+            self.bus.publish(frame)
+
+    def poll(self, now=None):
+        """Apply edits made in the UI and push status to the stream process."""
+        while self.edits.poll():
+            try:
+                kind, payload = self.edits.recv()
+            except EOFError:
+                break
+            if kind == "config":
+                self.runtime.update(payload)
+            elif kind == "profile_reset":
+                profiler.reset()
+
+        now = time.time() if now is None else now
+        if now - self._status_at >= self.status_interval:
+            self._status_at = now
+            self._push_status()
+
+    def _push_status(self):
+        cfg = self.runtime.snapshot()
+        msg = {
+            "roi_geometry": geometry_cache.latest(),
+            "profile": {"enabled": profiler.enabled, "spans": profiler.summary(),
+                        "counters": dict(profiler.counters)},
+        }
+        # config only when it changed here (JSON hot reload, the loop itself)
+        if cfg.version != self._config_version:
+            values = _plain_values(cfg)
+            changed = {k: v for k, v in values.items() if self._sent_config.get(k, _MISSING) != v}
+            if changed:
+                msg["config"] = changed
+            self._sent_config = values
+            self._config_version = cfg.version
+        try:
+            self.status.send(msg)
+        except (BrokenPipeError, OSError):
+            profiler.count("stream_process.status_dropped")
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning("stream process did not stop, terminating")
+            self.process.terminate()
+            self.process.join(timeout)
+        self.bus.close()
+
+
+# --- stream process side ---
+# an edit the drive loop has not echoed yet wins over pushed values for
+# its key, for at most this long
+PENDING_EDIT_S = 2.0
+
+
+def _receive_status(stream, status, stop, pending, pending_lock):
+    from utils.runtime_config import get_runtime_config
+
+    runtime = get_runtime_config(stream.conf)
+    while not stop.is_set():
+        if not status.poll(0.2):
+            continue
+        try:
+            msg = status.recv()
+        except EOFError:
+            break
+        config = msg.pop("config", None)
+        if config:
+            now = time.monotonic()
+            with pending_lock:
+                for key in list(config):
+                    if key not in pending:
+                        continue
+                    value, at = pending[key]
+                    if value == config[key] or now - at > PENDING_EDIT_S:
+                        del pending[key]
+                    else:
+                        del config[key]
+            runtime.update(config)
+        stream.remote_status = msg
+
+
+def _serve(bus_name, edits, status, stop):
+    import stream
+
+    # Ctrl+C reaches the whole process group; the drive loop decides when we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    bus = FrameBus(name=bus_name)
+    send_lock = threading.Lock()
+    pending = {} # key -> (value, monotonic time) of edits sent to the loop
+    pending_lock = threading.Lock()
+
+    def loop_sink(kind, payload):
+        if kind == "config":
+            now = time.monotonic()
+            with pending_lock:
+                pending.update((k, (v, now)) for k, v in payload.items())
+        # request threads share the pipe
+        with send_lock:
+            edits.send((kind, payload))
+
+    stream.frame_source = bus.latest
+    stream.loop_sink = loop_sink
+    stream.remote_status = {}
+
+    threading.Thread(target=_receive_status, args=(stream, status, stop, pending, pending_lock),
+                     name="stream-status", daemon=True).start()
+    threading.Thread(target=stream.start_stream, name="stream-server", daemon=True).start()
+    stop.wait()
+    stream.stop_stream()
@@ -10,6 +10,12 @@ import json
 import threading
 import logging
 import signal
+import struct
+import argparse
+import asyncio
+import queue
+from urllib.parse import parse_qs
+from collections import namedtuple
 from math import hypot
 from pathlib import Path
 
@@ -58,18 +64,34 @@ except Exception:
         def connection(self): return None
     hw = _DummyHW()
 
+class SimHW:
+    """Stands in for the Arduino during replay: keeps the last command."""
+    def __init__(self):
+        self.angle, self.speed, self.writes = None, 0, 0
+    def set_angle(self, a): self.angle = a; self.writes += 1
+    def set_speed(self, s): self.speed = s; self.writes += 1
+    def stop(self): self.speed = 0; self.writes += 1
+    @property
+    def connection(self): return None
+
 # ---------- Config ----------
 HOST = os.getenv('MANUAL_HOST', '0.0.0.0')
 PORT = int(os.getenv('MANUAL_PORT', '5010'))
 MANUAL_TOKEN = os.getenv('MANUAL_TOKEN', 'changeme')
 STATE_FILE = os.getenv('MANUAL_STATE_FILE', 'manual_enterprise_settings.json')
+RECORD_DIR = os.getenv('MANUAL_RECORD_DIR', 'recordings')
 Path('.').mkdir(parents=True, exist_ok=True)
 
 SERVO_CENTER = getattr(config_city, 'SERVO_CENTER', 90)
 DEFAULT_MAX_SPEED = getattr(config_city, 'SPEED', 255)
 
 CONTROL_HZ = 60.0
-UI_HZ = 20.0
+UI_HZ = 20.0          # top state broadcast rate, per client
+UI_MIN_HZ = 1.0       # a client that stops acking is slowed down to this
+ACK_TIMEOUT = 2.0     # s an unacked state update holds back the next one
+HW_STATS_HZ = 1.0     # hardware write counters on their own, when nothing else changed
+MAX_CLIENTS = int(os.getenv('MANUAL_MAX_CLIENTS', '8'))        # control sockets
+MAX_VIDEO_CLIENTS = int(os.getenv('MANUAL_MAX_VIDEO', '4'))    # /video_feed viewers
 WATCHDOG_MULT = 3.0
 
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
@@ -91,7 +113,9 @@ def default_settings():
         'speed_pid': [3.0, 0.0, 0.15],
         'keyboard_sensitivity': 1.0,
         'invert_mobile_y': False,
-        'record_inputs': False
+        'record_inputs': False,
+        'hw_min_interval': 0.02,  # s between two writes of one channel
+        'hw_keepalive': 0.5,      # s after which an unchanged value is re-sent
     }
 
 def load_settings():
@@ -113,21 +137,61 @@ def save_settings(s):
         log.exception('save settings failed')
 
 # ---------- State ----------
+# Targets, settings and the smoothed output are immutable snapshots held in
+# `state`; a writer builds a new one and swaps the reference, readers (the
+# control loop, the broadcaster) take the current reference without a lock.
+# Writers of targets/settings serialize on publish_lock, the client table
+# has its own lock; neither is held around hardware calls.
+class TimedLock:
+    """threading.Lock that records how long acquirers had to wait."""
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.acquires = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self._lock.acquire()
+            waited = time.perf_counter() - start
+            self.contended += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        self.acquires += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+    def stats(self):
+        return {'acquires': self.acquires, 'contended': self.contended,
+                'wait_ms_total': self.wait_total * 1e3, 'wait_ms_max': self.wait_max * 1e3}
+
+Targets = namedtuple('Targets', 'angle_target speed_target last_ui version')
+Output = namedtuple('Output', 'angle speed')
+
 settings = load_settings()
-state_lock = threading.Lock()
+publish_lock = TimedLock('publish')
+clients_lock = TimedLock('clients')
+_center = float(SERVO_CENTER) + float(settings.get('angle_trim', 0.0))
 state = {
-    'angle': float(SERVO_CENTER) + float(settings.get('angle_trim', 0.0)),
-    'speed': 0.0,
-    'angle_target': float(SERVO_CENTER) + float(settings.get('angle_trim', 0.0)),
-    'speed_target': 0.0,
-    'last_ui': time.monotonic(),
+    'targets': Targets(_center, 0.0, time.monotonic(), 0),
+    'output': Output(_center, 0.0),  # written by the control loop only
+    'settings': settings,
     'last_cmd': time.monotonic(),
     'clients': {},
     'seq_seen': {},
-    'settings': settings
 }
 
-cam = Camera()
+def publish_targets(**changes):
+    """Swap in a new targets snapshot (caller holds publish_lock)."""
+    current = state['targets']
+    targets = current._replace(version=current.version + 1, **changes)
+    state['targets'] = targets
+    return targets
 
 # ---------- PID ----------
 class PID:
@@ -153,82 +217,99 @@ app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins='*', async_mode='threading')
 
 # ---------- Socket handlers ----------
-@socketio.on('connect')
-def on_connect(auth):
-    token = request.args.get('token') or (auth.get('token') if isinstance(auth, dict) else None)
-    sid = request.sid
+# handle_* take the socket id and message and return the (event, payload)
+# reply or None; the threading (Flask-SocketIO) and async (python-socketio)
+# servers only differ in the thin wrappers that call them.
+def handle_connect(sid, token, compact=False):
+    """Register a client; None rejects it."""
     log.info('connect attempt sid=%s token=%s', sid, str(token)[:10])
     if token != MANUAL_TOKEN:
         log.warning('rejecting connect sid=%s (bad token)', sid)
-        disconnect()
-        return
-    with state_lock:
-        state['clients'][sid] = {'last_seen': time.monotonic()}
-    emit('init', {'angle': state['angle'], 'speed': state['speed'], 'settings': state['settings']})
+        return None
+    with clients_lock:
+        if len(state['clients']) >= MAX_CLIENTS:
+            log.warning('rejecting connect sid=%s (%d clients)', sid, MAX_CLIENTS)
+            return None
+        state['clients'][sid] = new_client(compact)
+    out = state['output']
     log.info('client connected %s', sid)
+    return 'init', {'angle': out.angle, 'speed': out.speed, 'settings': state['settings']}
 
-@socketio.on('disconnect')
-def on_disconnect():
-    sid = request.sid
+def handle_disconnect(sid, msg=None):
     log.info('disconnect %s', sid)
-    with state_lock:
+    with clients_lock:
         state['clients'].pop(sid, None)
         state['seq_seen'].pop(sid, None)
 
-@socketio.on('input')
-def on_input(msg):
-    sid = request.sid
+def handle_input(sid, msg):
     seq = msg.get('seq')
     if seq is None:
-        emit('cmd_nack', {'seq': None, 'err': 'no_seq'})
-        return
-    with state_lock:
+        return 'cmd_nack', {'seq': None, 'err': 'no_seq'}
+    now = time.monotonic()
+    with clients_lock:
         last = state['seq_seen'].get(sid)
         if last is not None and seq <= last:
-            emit('cmd_ack', {'seq': seq})
-            return
-        state['seq_seen'][sid] = seq
-        state['last_cmd'] = time.monotonic()
-        state['clients'].setdefault(sid, {})['last_seen'] = time.monotonic()
-        state['last_ui'] = time.monotonic()
+            duplicate = True
+        else:
+            duplicate = False
+            state['seq_seen'][sid] = seq
+            state['clients'].setdefault(sid, new_client())['last_seen'] = now
+    if duplicate:
+        return 'cmd_ack', {'seq': seq}
+    state['last_cmd'] = now
 
-        try:
-            forward = float(msg.get('forward', 0.0))
-            steer = float(msg.get('steer', 0.0))
-            speed_scale = float(msg.get('speed_scale', 1.0))
-        except Exception:
-            emit('cmd_nack', {'seq': seq, 'err': 'bad_payload'})
-            return
+    try:
+        forward = float(msg.get('forward', 0.0))
+        steer = float(msg.get('steer', 0.0))
+        speed_scale = float(msg.get('speed_scale', 1.0))
+    except Exception:
+        return 'cmd_nack', {'seq': seq, 'err': 'bad_payload'}
 
-        forward = max(-1.0, min(1.0, forward))
-        steer = max(-1.0, min(1.0, steer))
-        speed_scale = max(0.0, min(1.0, speed_scale))
+    is_mobile = bool(msg.get('is_mobile'))
+    with publish_lock:
+        # queued before the swap: an output that used these targets is
+        # always written after them
+        recorder.input(now, seq, forward, steer, speed_scale, is_mobile)
+        apply_input(forward, steer, speed_scale, is_mobile, now)
 
-        s = state['settings']
-        if msg.get('is_mobile') and s.get('invert_mobile_y', False):
-            forward = -forward
+    return 'cmd_ack', {'seq': seq}
 
-        angle_limit = float(s.get('angle_limit_deg', 60.0))
-        angle_target = SERVO_CENTER + float(s.get('angle_trim', 0.0)) + steer * angle_limit
-        angle_target = max(0.0, min(180.0, angle_target))
+def apply_input(forward, steer, speed_scale, is_mobile, now):
+    """Publish the angle/speed targets of one input message (caller holds publish_lock)."""
+    forward = max(-1.0, min(1.0, forward))
+    steer = max(-1.0, min(1.0, steer))
+    speed_scale = max(0.0, min(1.0, speed_scale))
 
-        max_speed = int(s.get('speed_limit', s.get('max_speed', DEFAULT_MAX_SPEED)))
-        speed_target = max_speed * forward * speed_scale
+    s = state['settings']
+    if is_mobile and s.get('invert_mobile_y', False):
+        forward = -forward
 
-        state['angle_target'] = angle_target
-        state['speed_target'] = speed_target
+    angle_limit = float(s.get('angle_limit_deg', 60.0))
+    angle_target = SERVO_CENTER + float(s.get('angle_trim', 0.0)) + steer * angle_limit
+    angle_target = max(0.0, min(180.0, angle_target))
 
-    emit('cmd_ack', {'seq': seq})
+    max_speed = int(s.get('speed_limit', s.get('max_speed', DEFAULT_MAX_SPEED)))
+    speed_target = max_speed * forward * speed_scale
 
-@socketio.on('set_setting')
-def on_set_setting(msg):
+    return publish_targets(angle_target=angle_target, speed_target=speed_target, last_ui=now)
+
+def apply_heartbeat(now):
+    """A heartbeat keeps the deadman off (caller holds publish_lock)."""
+    targets = state['targets']
+    # once the deadman fired the car stays stopped until the next input
+    if now - targets.last_ui > state['settings'].get('deadman', 1.0):
+        return publish_targets(speed_target=0.0, last_ui=now)
+    return publish_targets(last_ui=now)
+
+def handle_set_setting(sid, msg):
     key = msg.get('key')
     val = msg.get('value')
-    if key is None: return
-    with state_lock:
-        s = state['settings']
+    if key is None: return None
+    with publish_lock:
+        s = dict(state['settings'])
         try:
-            if key in ('deadman','angle_alpha','speed_alpha','angle_limit_deg','speed_limit','keyboard_sensitivity','angle_trim'):
+            if key in ('deadman','angle_alpha','speed_alpha','angle_limit_deg','speed_limit','keyboard_sensitivity','angle_trim',
+                       'hw_min_interval','hw_keepalive'):
                 s[key] = float(val)
             elif key in ('jpeg_quality','max_speed'):
                 s[key] = int(val)
@@ -244,95 +325,563 @@ def on_set_setting(msg):
             global pid_angle, pid_speed
             pid_angle = PID(*s.get('angle_pid', [2.0,0,0.25]))
             pid_speed = PID(*s.get('speed_pid', [3.0,0,0.15]))
-            save_settings(s)
-            emit('setting_ack', {'key': key, 'value': s.get(key)})
+            state['settings'] = s
+            recorder.sync(s)
+            recorder.settings(time.monotonic(), s)
         except Exception:
             log.exception('set_setting fail')
-
-@socketio.on('heartbeat')
-def on_heartbeat(msg):
-    sid = request.sid
-    with state_lock:
-        state['last_ui'] = time.monotonic()
-        state['clients'].setdefault(sid, {})['last_seen'] = time.monotonic()
-    emit('heartbeat_ack', {'t': msg.get('t'), 'server': time.time()})
+            return None
+    save_settings(s)
+    return 'setting_ack', {'key': key, 'value': s.get(key)}
+
+def handle_heartbeat(sid, msg):
+    now = time.monotonic()
+    with clients_lock:
+        state['clients'].setdefault(sid, new_client())['last_seen'] = now
+    with publish_lock:
+        recorder.heartbeat(now)
+        apply_heartbeat(now)
+    return 'heartbeat_ack', {'t': msg.get('t'), 'server': time.time()}
 
 # ---------- Broadcaster ----------
+# Each client gets only the fields that changed since the last update it
+# was sent ('state', {'v': version, ...changed}) or, with ?compact=1, the
+# fixed binary record below ('state_bin'). Settings go out as 'settings'
+# only when they change. Clients ack every update with 'state_ack'; while
+# one is outstanding the client's interval doubles (down to UI_MIN_HZ),
+# prompt acks bring it back to UI_HZ, so a weak link is not flooded.
+# Hardware write counters ('hw') move every control step even when idle, so
+# they don't count as a change: they ride along with the next real update,
+# or go out on their own at HW_STATS_HZ.
+_STATE_BIN = struct.Struct('<IffffHII')  # v, angle, speed, angle_t, speed_t, clients, writes, suppressed
+
+def new_client(compact=False):
+    return {
+        'last_seen': time.monotonic(), 'compact': compact,
+        'sent': None, 'pending': None, 'sent_at': 0.0,
+        'interval': 1.0 / UI_HZ, 'next': 0.0,
+        'hw': None, 'hw_at': 0.0,
+    }
+
+def state_snapshot():
+    out, targets = state['output'], state['targets']
+    return {
+        'angle': round(out.angle, 1), 'speed': round(out.speed, 1),
+        'angle_target': round(targets.angle_target, 1), 'speed_target': round(targets.speed_target, 1),
+        'clients': len(state['clients']),
+    }
+
+def pack_state(version, snap, hw):
+    return _STATE_BIN.pack(version & 0xffffffff, snap['angle'], snap['speed'], snap['angle_target'],
+                           snap['speed_target'], min(snap['clients'], 0xffff),
+                           hw['writes'] & 0xffffffff, hw['suppressed'] & 0xffffffff)
+
+def handle_state_ack(sid, msg):
+    now = time.monotonic()
+    with clients_lock:
+        c = state['clients'].get(sid)
+        if c is None or c['pending'] is None or c['pending'] != msg.get('v'):
+            return None
+        rtt = now - c['sent_at']
+        c['pending'] = None
+        # recover towards UI_HZ, but not faster than the link answers
+        c['interval'] = max(1.0 / UI_HZ, min(1.0 / UI_MIN_HZ, max(c['interval'] * 0.5, 2 * rtt)))
+
+class StateBroadcaster:
+    """Works out one broadcast tick; the servers do the emitting."""
+    def __init__(self):
+        self.version = 0
+        self.last = None
+        self.last_settings = None
+
+    def tick(self, now):
+        """Returns (settings if they changed else None, [(event, payload, sid)])."""
+        snap = state_snapshot()
+        hw = hw_writer.stats()
+        if snap != self.last:
+            self.version += 1
+            self.last = snap
+        sett = state['settings']
+        changed_settings = None
+        if sett is not self.last_settings:
+            changed_settings = self.last_settings = sett
+
+        sends = []
+        with clients_lock:
+            for sid, c in state['clients'].items():
+                if now < c['next']:
+                    continue
+                if c['pending'] is not None and now - c['sent_at'] < ACK_TIMEOUT:
+                    c['interval'] = min(1.0 / UI_MIN_HZ, c['interval'] * 2)
+                    c['next'] = now + c['interval']
+                    continue
+                sent = c['sent']
+                delta = {k: v for k, v in snap.items() if sent is None or sent[k] != v}
+                hw_changed = hw != c['hw']
+                if not delta and not (hw_changed and now - c['hw_at'] >= 1.0 / HW_STATS_HZ):
+                    continue
+                if hw_changed:
+                    delta['hw'] = c['hw'] = hw
+                    c['hw_at'] = now
+                c['sent'] = snap
+                c['pending'] = self.version
+                c['sent_at'] = now
+                c['next'] = now + c['interval']
+                if c['compact']:
+                    sends.append(('state_bin', pack_state(self.version, snap, hw), sid))
+                else:
+                    delta['v'] = self.version
+                    sends.append(('state', delta, sid))
+        return changed_settings, sends
+
 def broadcaster():
     interval = 1.0 / UI_HZ
+    bc = StateBroadcaster()
     while True:
-        with state_lock:
-            payload = {
-                'angle': state['angle'], 'speed': state['speed'],
-                'angle_target': state['angle_target'], 'speed_target': state['speed_target'],
-                'settings': state['settings'], 'clients': len(state['clients'])
-            }
-        socketio.emit('state', payload)
+        sett, sends = bc.tick(time.monotonic())
+        if sett is not None:
+            socketio.emit('settings', sett)
+        for event, payload, sid in sends:
+            socketio.emit(event, payload, to=sid)
         socketio.sleep(interval)
 
+# Flask-SocketIO (threading) wrappers
+def _reply(reply):
+    if reply is not None:
+        emit(*reply)
+
+@socketio.on('connect')
+def on_connect(auth):
+    token = request.args.get('token') or (auth.get('token') if isinstance(auth, dict) else None)
+    reply = handle_connect(request.sid, token, request.args.get('compact') in ('1', 'true'))
+    if reply is None:
+        disconnect()
+        return
+    _reply(reply)
+
+@socketio.on('disconnect')
+def on_disconnect():
+    handle_disconnect(request.sid)
+
+for _event, _handler in (('input', handle_input), ('set_setting', handle_set_setting),
+                         ('heartbeat', handle_heartbeat), ('state_ack', handle_state_ack)):
+    socketio.on_event(_event, lambda msg=None, _handler=_handler: _reply(_handler(request.sid, msg or {})))
+
 # ---------- Control loop ----------
 _stop = threading.Event()
+
+def control_step(targets, sett, now, dt):
+    """
+    One smoothing tick towards a targets snapshot; publishes the new output
+    and returns it with the (angle, speed) to send to the hardware.
+    Control loop thread only.
+    """
+    out = state['output']
+    angle, speed = out.angle, out.speed
+    speed_target = targets.speed_target
+    if now - targets.last_ui > sett.get('deadman',1.0):
+        speed_target = 0.0
+    if sett.get('smoothing_mode','alpha') == 'pid':
+        a_cmd = pid_angle.step(targets.angle_target, angle, dt)
+        sp_cmd = pid_speed.step(speed_target, speed, dt)
+        angle += a_cmd * dt
+        speed += sp_cmd * dt
+    else:
+        aa = float(sett.get('angle_alpha',0.18))
+        sa = float(sett.get('speed_alpha',0.20))
+        scale = dt * CONTROL_HZ
+        a_alpha = 1.0 - pow(1.0-aa, scale)
+        s_alpha = 1.0 - pow(1.0-sa, scale)
+        angle += (targets.angle_target - angle) * a_alpha
+        speed += (speed_target - speed) * s_alpha
+    angle = max(0.0, min(180.0, angle))
+    maxs = int(sett.get('speed_limit', sett.get('max_speed', DEFAULT_MAX_SPEED)))
+    speed = max(-maxs, min(maxs, speed))
+    out = state['output'] = Output(angle, speed)
+    return out, int(round(angle)), int(round(speed))
+
+class HardwareWriter:
+    """
+    Sends a servo/motor value only when its integer changed, at most once
+    per hw_min_interval per channel, and re-sends an unchanged value after
+    hw_keepalive. A skipped change goes out on a later tick, because the
+    check is against the last value actually sent.
+    """
+    def __init__(self):
+        self.sent = {'angle': None, 'speed': None}
+        self.sent_at = {'angle': float('-inf'), 'speed': float('-inf')}
+        self.writes = 0
+        self.suppressed = 0
+
+    def _due(self, channel, value, now, sett):
+        since = now - self.sent_at[channel]
+        if value != self.sent[channel]:
+            return since >= float(sett.get('hw_min_interval', 0.02))
+        return since >= float(sett.get('hw_keepalive', 0.5))
+
+    def _send(self, channel, value, now, fn, *args):
+        fn(*args)
+        self.sent[channel] = value
+        self.sent_at[channel] = now
+        self.writes += 1
+
+    def apply(self, angle_hw, speed_hw, now, sett):
+        if self._due('angle', angle_hw, now, sett):
+            self._send('angle', angle_hw, now, hw.set_angle, angle_hw)
+        else:
+            self.suppressed += 1
+        # every speed under 3 is the same "stop" command
+        speed = 0 if abs(speed_hw) < 3 else speed_hw
+        if self._due('speed', speed, now, sett):
+            if speed == 0:
+                self._send('speed', 0, now, hw.stop)
+            else:
+                self._send('speed', speed, now, hw.set_speed, speed)
+        else:
+            self.suppressed += 1
+
+    def stop(self, now):
+        """Watchdog stop: goes out at once, skipping min interval, unless already stopped."""
+        if self.sent['speed'] != 0:
+            self._send('speed', 0, now, hw.stop)
+
+    def stats(self):
+        return {'writes': self.writes, 'suppressed': self.suppressed}
+
+hw_writer = HardwareWriter()
+
+def apply_hw(angle_hw, speed_hw, now, sett):
+    hw_writer.apply(angle_hw, speed_hw, now, sett)
+
 def control_loop():
-    global pid_angle, pid_speed
     last = time.monotonic()
     interval = 1.0 / CONTROL_HZ
     while not _stop.is_set():
         now = time.monotonic()
         dt = max(1e-4, now - last)
         last = now
-        with state_lock:
-            s = state
-            sett = s['settings']
-            if now - s['last_ui'] > sett.get('deadman',1.0):
-                s['speed_target'] = 0.0
-            if sett.get('smoothing_mode','alpha') == 'pid':
-                a_cmd = pid_angle.step(s['angle_target'], s['angle'], dt)
-                sp_cmd = pid_speed.step(s['speed_target'], s['speed'], dt)
-                s['angle'] += a_cmd * dt
-                s['speed'] += sp_cmd * dt
-            else:
-                aa = float(sett.get('angle_alpha',0.18))
-                sa = float(sett.get('speed_alpha',0.20))
-                scale = dt * CONTROL_HZ
-                a_alpha = 1.0 - pow(1.0-aa, scale)
-                s_alpha = 1.0 - pow(1.0-sa, scale)
-                s['angle'] += (s['angle_target'] - s['angle']) * a_alpha
-                s['speed'] += (s['speed_target'] - s['speed']) * s_alpha
-            s['angle'] = max(0.0, min(180.0, s['angle']))
-            maxs = int(sett.get('speed_limit', sett.get('max_speed', DEFAULT_MAX_SPEED)))
-            s['speed'] = max(-maxs, min(maxs, s['speed']))
-            angle_hw = int(round(s['angle']))
-            speed_hw = int(round(s['speed']))
+        targets, sett = state['targets'], state['settings']
+        out, angle_hw, speed_hw = control_step(targets, sett, now, dt)
+        recorder.output(now, dt, out.angle, out.speed, angle_hw, speed_hw, frames.seq, targets.version)
         try:
-            hw.set_angle(angle_hw)
-            if abs(speed_hw) < 3:
-                hw.stop()
-            else:
-                hw.set_speed(speed_hw)
+            apply_hw(angle_hw, speed_hw, now, sett)
         except Exception:
             log.exception('hardware apply error')
-        with state_lock:
-            if time.monotonic() - state['last_ui'] > state['settings'].get('deadman',1.0) * WATCHDOG_MULT:
-                try:
-                    hw.stop()
-                    state['speed_target'] = 0.0
-                except Exception:
-                    pass
+        if now - targets.last_ui > sett.get('deadman',1.0) * WATCHDOG_MULT:
+            try:
+                hw_writer.stop(now)
+            except Exception:
+                pass
         time.sleep(interval)
 
+# ---------- Recording & replay ----------
+# Append-only binary log: a magic line, then records of
+#   one type byte + little-endian struct payload
+#   I  input:    t, seq, forward, steer, speed_scale, is_mobile
+#   O  output:   t, dt, angle, speed, angle_hw, speed_hw, frame_seq, targets version
+#   H  heartbeat: t (keeps the deadman from firing)
+#   S  settings: t, length, JSON {settings, angle, speed, targets}
+# Times are time.monotonic() seconds of the recording session. Every
+# targets publish is an I or H record, so a replay numbers them the same.
+LOG_MAGIC = b"MANUALLOG2\n"
+_REC_INPUT = struct.Struct('<dIfffB')
+_REC_OUTPUT = struct.Struct('<ddffhhII')
+_REC_HEARTBEAT = struct.Struct('<d')
+_REC_SETTINGS = struct.Struct('<dI')
+
+class InputRecorder:
+    """
+    Writes the log while the record_inputs setting is on. Records are
+    queued in call order and a thread of their own does the file I/O, so
+    handlers can record under publish_lock (which keeps I/H records in
+    publish order) without holding it across a disk write.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.recording = False
+        self.path = None
+        self.f = None  # writer thread only
+
+    @property
+    def active(self):
+        return self.recording
+
+    def _put(self, item):
+        # caller holds self.lock
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._writer, name='recorder', daemon=True)
+            self.thread.start()
+        self.queue.put(item)
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                if isinstance(item, bytes):
+                    if self.f is not None:
+                        self.f.write(item)
+                elif item[0] == 'open':
+                    Path(self.directory).mkdir(parents=True, exist_ok=True)
+                    self.f = open(item[1], 'ab')
+                    self.f.write(LOG_MAGIC)
+                    log.info('recording inputs to %s', item[1])
+                elif self.f is not None:
+                    self.f.close()
+                    self.f = None
+                    log.info('recording stopped: %s', self.path)
+            except Exception:
+                log.exception('recorder write failed')
+
+    def sync(self, sett):
+        """Open a new log when record_inputs turns on, close it when it turns off."""
+        with self.lock:
+            if sett.get('record_inputs') and not self.recording:
+                self.path = os.path.join(self.directory, time.strftime('manual_%Y%m%d_%H%M%S.bin'))
+                self.recording = True
+                self._put(('open', self.path))
+            elif not sett.get('record_inputs') and self.recording:
+                self.recording = False
+                self._put(('close',))
+
+    def _write(self, kind, packed, extra=b''):
+        with self.lock:
+            if self.recording:
+                self._put(kind + packed + extra)
+
+    def input(self, t, seq, forward, steer, speed_scale, is_mobile):
+        if self.recording:
+            self._write(b'I', _REC_INPUT.pack(t, int(seq) & 0xffffffff, forward, steer, speed_scale, is_mobile))
+
+    def output(self, t, dt, angle, speed, angle_hw, speed_hw, frame_seq, version):
+        if self.recording:
+            self._write(b'O', _REC_OUTPUT.pack(t, dt, angle, speed, angle_hw, speed_hw,
+                                               frame_seq & 0xffffffff, version & 0xffffffff))
+
+    def heartbeat(self, t):
+        if self.recording:
+            self._write(b'H', _REC_HEARTBEAT.pack(t))
+
+    def settings(self, t, sett):
+        # with the smoothed state, so a replay starts where the car was
+        if self.recording:
+            out, targets = state['output'], state['targets']
+            data = json.dumps({
+                'settings': sett, 'output': out._asdict(), 'targets': targets._asdict(),
+            }).encode()
+            self._write(b'S', _REC_SETTINGS.pack(t, len(data)), data)
+
+    def close(self, timeout=2.0):
+        """Close the log once everything queued is written."""
+        with self.lock:
+            if self.thread is None:
+                return
+            self.recording = False
+            self.queue.put(('close',))
+            self.queue.put(None)
+            thread, self.thread = self.thread, None
+        thread.join(timeout)
+
+recorder = InputRecorder(RECORD_DIR)
+
+def read_log(path):
+    """Yield (kind, t, fields) from a recorded log."""
+    with open(path, 'rb') as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f'{path}: not a manual control log')
+        while True:
+            kind = f.read(1)
+            if not kind:
+                return
+            if kind == b'I':
+                t, *fields = _REC_INPUT.unpack(f.read(_REC_INPUT.size))
+            elif kind == b'O':
+                t, *fields = _REC_OUTPUT.unpack(f.read(_REC_OUTPUT.size))
+            elif kind == b'H':
+                t, = _REC_HEARTBEAT.unpack(f.read(_REC_HEARTBEAT.size))
+                fields = []
+            elif kind == b'S':
+                t, n = _REC_SETTINGS.unpack(f.read(_REC_SETTINGS.size))
+                fields = [json.loads(f.read(n))]
+            else:
+                raise ValueError(f'{path}: bad record type {kind!r}')
+            yield kind, t, fields
+
+def replay(path, realtime=True):
+    """
+    Feed a log back through control_step against SimHW. Control ticks run
+    at the recorded times and dt, so the outputs should match the log
+    exactly. The max deviation is reported with the tick rate reached,
+    which benchmarks the control loop when realtime is False.
+    """
+    global hw, hw_writer, pid_angle, pid_speed
+    hw = SimHW()
+    hw_writer = HardwareWriter()
+    start_wall = time.perf_counter()
+    t0 = None
+    ticks = inputs = 0
+    max_angle_err = max_speed_err = 0
+    step_time = 0.0
+    history = {}  # targets by version, outputs may refer to an older one
+    for kind, t, fields in read_log(path):
+        if t0 is None:
+            t0 = t
+        if realtime:
+            delay = (t - t0) - (time.perf_counter() - start_wall)
+            if delay > 0:
+                time.sleep(delay)
+        if kind == b'S':
+            snap = fields[0]
+            with publish_lock:
+                state['settings'] = snap['settings']
+                state['output'] = Output(**snap['output'])
+                state['targets'] = Targets(**snap['targets'])
+                history[state['targets'].version] = state['targets']
+            pid_angle = PID(*snap['settings'].get('angle_pid', [2.0,0,0.25]))
+            pid_speed = PID(*snap['settings'].get('speed_pid', [3.0,0,0.15]))
+        elif kind == b'H':
+            with publish_lock:
+                targets = apply_heartbeat(t)
+            history[targets.version] = targets
+        elif kind == b'I':
+            _seq, forward, steer, speed_scale, is_mobile = fields
+            with publish_lock:
+                targets = apply_input(forward, steer, speed_scale, bool(is_mobile), t)
+            history[targets.version] = targets
+            inputs += 1
+        else:
+            dt, _angle, _speed, angle_hw, speed_hw, _frame_seq, version = fields
+            started = time.perf_counter()
+            sett = state['settings']
+            _, *out = control_step(history.get(version, state['targets']), sett, t, dt)
+            apply_hw(*out, t, sett)
+            step_time += time.perf_counter() - started
+            ticks += 1
+            max_angle_err = max(max_angle_err, abs(out[0] - angle_hw))
+            max_speed_err = max(max_speed_err, abs(out[1] - speed_hw))
+    wall = time.perf_counter() - start_wall
+    result = {
+        'inputs': inputs,
+        'ticks': ticks,
+        'recorded_s': 0.0 if t0 is None else t - t0,
+        'wall_s': wall,
+        'ticks_per_s': ticks / step_time if step_time else None,
+        'max_angle_err': max_angle_err,
+        'max_speed_err': max_speed_err,
+        'hw_writes': hw.writes,
+        'hw_suppressed': hw_writer.suppressed,
+    }
+    log.info('replay %s: %s', path, json.dumps(result))
+    return result
+
 # ---------- MJPEG ----------
+class FrameBroadcaster:
+    """
+    One thread captures and encodes at the current jpeg_quality for all
+    /video_feed clients. Each client gets the latest frame and skips the
+    ones it was too slow for. The thread idles while nobody watches.
+    The camera is opened by the first viewer, so --replay runs without one.
+    """
+    def __init__(self, open_camera):
+        self.open_camera = open_camera
+        self.cam = None
+        self.cond = threading.Condition()
+        self.jpg = None
+        self.seq = 0
+        self.clients = 0
+        self.thread = None
+        self.async_waiters = []  # (loop, future) of astream() clients
+
+    def _start(self):
+        # caller holds self.cond
+        self.clients += 1
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._capture_loop, name='mjpeg-capture', daemon=True)
+            self.thread.start()
+        self.cond.notify_all()
+
+    def _capture_loop(self):
+        while not _stop.is_set():
+            with self.cond:
+                if self.clients == 0:
+                    self.cond.wait(0.5)
+                    continue
+            if self.cam is None:
+                try:
+                    self.cam = self.open_camera()
+                except Exception:
+                    log.exception('camera open failed')
+                    time.sleep(1.0); continue
+            frame = self.cam.capture_frame(resize=False)
+            if frame is None:
+                time.sleep(0.01); continue
+            if cv2 is None:
+                time.sleep(0.1); continue
+            q = int(state['settings'].get('jpeg_quality',70))
+            ok, jpg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), q])
+            if not ok:
+                time.sleep(0.01); continue
+            with self.cond:
+                self.jpg = jpg.tobytes()
+                self.seq += 1
+                self.cond.notify_all()
+                waiters, self.async_waiters = self.async_waiters, []
+            for loop, fut in waiters:
+                loop.call_soon_threadsafe(_resolve, fut)
+
+    def stream(self):
+        with self.cond:
+            self._start()
+        seen = 0
+        try:
+            while True:
+                with self.cond:
+                    if not self.cond.wait_for(lambda: self.seq != seen, timeout=1.0):
+                        continue
+                    seen, jpg = self.seq, self.jpg
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg + b"\r\n")
+        finally:
+            with self.cond:
+                self.clients -= 1
+
+    async def astream(self):
+        """stream() for the event loop: waits on a future, not a thread."""
+        loop = asyncio.get_running_loop()
+        with self.cond:
+            self._start()
+        seen = 0
+        try:
+            while True:
+                fut = None
+                with self.cond:
+                    if self.seq != seen:
+                        seen, jpg = self.seq, self.jpg
+                    else:
+                        fut = loop.create_future()
+                        self.async_waiters.append((loop, fut))
+                if fut is not None:
+                    try:
+                        await asyncio.wait_for(fut, 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg + b"\r\n")
+        finally:
+            with self.cond:
+                self.clients -= 1
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+frames = FrameBroadcaster(Camera)
+
 def mjpeg_stream():
-    while True:
-        frame = cam.capture_frame(resize=False)
-        if frame is None:
-            time.sleep(0.01); continue
-        q = int(state['settings'].get('jpeg_quality',70))
-        if cv2 is None:
-            time.sleep(0.1); continue
-        ok, jpg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), q])
-        if not ok:
-            time.sleep(0.01); continue
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg.tobytes() + b"\r\n")
+    return frames.stream()
 
 # ---------- UI (full HTML + JS) ----------
 INDEX_HTML = r"""
@@ -536,16 +1085,35 @@ img#video{position:fixed;inset:0;width:100%;height:100%;object-fit:cover;z-index
 
 /* Socket */
 const TOKEN = prompt('MANUAL token (press enter to skip)','changeme') || 'changeme';
-const socket = io({ query: { token: TOKEN } });
+const socket = io({ query: { token: TOKEN, compact: localStorage.getItem('man_compact') === '1' ? 1 : 0 } });
 
 socket.on('connect', ()=> console.log('socket connected'));
 socket.on('disconnect', ()=> console.log('socket disconnected'));
 socket.on('connect_error', e => console.warn('socket error', e));
 
-/* Show server state if provided */
-socket.on('state', s => {
-  if(s && typeof s.clients !== 'undefined') document.getElementById('hud_clients').textContent = s.clients;
+/* Server state: deltas ('state') or compact binary ('state_bin'), each acked
+   so the server can slow down on a weak link. Compact: localStorage man_compact=1 */
+const serverState = {};
+function showServerState(v){
+  if(typeof serverState.clients !== 'undefined') document.getElementById('hud_clients').textContent = serverState.clients;
+  socket.emit('state_ack', { v: v });
+}
+socket.on('state', d => {
+  if(!d) return;
+  Object.assign(serverState, d);
+  showServerState(d.v);
+});
+socket.on('state_bin', buf => {
+  const dv = buf instanceof ArrayBuffer ? new DataView(buf) : new DataView(buf.buffer, buf.byteOffset, buf.byteLength);
+  serverState.angle = dv.getFloat32(4, true);
+  serverState.speed = dv.getFloat32(8, true);
+  serverState.angle_target = dv.getFloat32(12, true);
+  serverState.speed_target = dv.getFloat32(16, true);
+  serverState.clients = dv.getUint16(20, true);
+  serverState.hw = { writes: dv.getUint32(22, true), suppressed: dv.getUint32(26, true) };
+  showServerState(dv.getUint32(0, true));
 });
+socket.on('settings', s => { serverState.settings = s; });
 
 /* Ping (heartbeat) — compute RTT when server replies with heartbeat_ack */
 socket.on('heartbeat_ack', (m) => {
@@ -904,14 +1472,115 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
+    if frames.clients >= MAX_VIDEO_CLIENTS:
+        return Response('too many viewers', status=503)
     return Response(mjpeg_stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+def stats_payload():
+    """Lock wait times and hardware write counts."""
+    return {
+        'locks': {lock.name: lock.stats() for lock in (publish_lock, clients_lock)},
+        'hw': hw_writer.stats(),
+        'targets_version': state['targets'].version,
+        'video_clients': frames.clients,
+    }
+
+@app.route('/stats')
+def stats():
+    return Response(json.dumps(stats_payload()), mimetype='application/json')
+
+# ---------- asyncio server ----------
+def run_async(host, port):
+    """
+    Serve the page, /video_feed, /stats and the control socket from one
+    asyncio event loop (aiohttp + python-socketio AsyncServer) instead of a
+    thread per connection. The control loop and camera capture stay on
+    their own threads. Needs aiohttp and python-socketio.
+    """
+    from aiohttp import web
+    import socketio as sio_lib
+
+    sio = sio_lib.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+    web_app = web.Application()
+    sio.attach(web_app)
+    video_slots = asyncio.Semaphore(MAX_VIDEO_CLIENTS)
+
+    @sio.event
+    async def connect(sid, environ, auth=None):
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        token = (query.get('token') or [None])[0] or (auth.get('token') if isinstance(auth, dict) else None)
+        reply = handle_connect(sid, token, (query.get('compact') or [''])[0] in ('1', 'true'))
+        if reply is None:
+            return False
+        await sio.emit(*reply, to=sid)
+
+    @sio.event
+    async def disconnect(sid):
+        handle_disconnect(sid)
+
+    def on(event, handler, blocking=False):
+        async def wrapper(sid, msg=None):
+            if blocking:
+                # saves the settings file; the disk stays off the event loop
+                reply = await asyncio.get_running_loop().run_in_executor(None, handler, sid, msg or {})
+            else:
+                reply = handler(sid, msg or {})
+            if reply is not None:
+                await sio.emit(*reply, to=sid)
+        sio.on(event, wrapper)
+
+    on('set_setting', handle_set_setting, blocking=True)
+    for event, handler in (('input', handle_input), ('heartbeat', handle_heartbeat),
+                           ('state_ack', handle_state_ack)):
+        on(event, handler)
+
+    async def index(request):
+        return web.Response(text=INDEX_HTML, content_type='text/html')
+
+    async def stats_route(request):
+        return web.json_response(stats_payload())
+
+    async def video(request):
+        if video_slots.locked():
+            return web.Response(status=503, text='too many viewers')
+        async with video_slots:
+            resp = web.StreamResponse(headers={'Content-Type': 'multipart/x-mixed-replace; boundary=frame'})
+            await resp.prepare(request)
+            try:
+                async for chunk in frames.astream():
+                    await resp.write(chunk)
+            except (ConnectionResetError, asyncio.CancelledError):
+                pass
+            return resp
+
+    async def broadcast_loop():
+        bc = StateBroadcaster()
+        while True:
+            sett, sends = bc.tick(time.monotonic())
+            if sett is not None:
+                await sio.emit('settings', sett)
+            for event, payload, sid in sends:
+                await sio.emit(event, payload, to=sid)
+            await asyncio.sleep(1.0 / UI_HZ)
+
+    async def start_background(app_):
+        app_['broadcaster'] = asyncio.ensure_future(broadcast_loop())
+
+    web_app.router.add_get('/', index)
+    web_app.router.add_get('/stats', stats_route)
+    web_app.router.add_get('/video_feed', video)
+    web_app.on_startup.append(start_background)
+    web.run_app(web_app, host=host, port=port, handle_signals=False)
+
 # ---------- Shutdown & start ----------
 def _shutdown(*args):
     log.info('shutdown: stopping hw & camera')
+    try: recorder.close()
+    except Exception: pass
     try: hw.stop()
     except Exception: pass
-    try: cam.release()
+    try:
+        if frames.cam is not None: frames.cam.release()
     except Exception: pass
     os._exit(0)
 
@@ -919,8 +1588,26 @@ signal.signal(signal.SIGINT, _shutdown)
 signal.signal(signal.SIGTERM, _shutdown)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replay', metavar='LOG', help='replay a recorded input log against simulated hardware and exit')
+    parser.add_argument('--max-speed', action='store_true', help='replay as fast as possible instead of at 1x')
+    parser.add_argument('--server', choices=('threading', 'async'), default=os.getenv('MANUAL_SERVER', 'threading'),
+                        help='async: one aiohttp event loop for all connections (needs aiohttp, python-socketio)')
+    args = parser.parse_args()
+    if args.replay:
+        replay(args.replay, realtime=not args.max_speed)
+        sys.exit(0)
+
+    recorder.sync(settings)
+    recorder.settings(time.monotonic(), settings)
     log.info('Starting manual_controller_enterprise (fixed) on %s:%s (token=%s)', HOST, PORT, MANUAL_TOKEN)
     t_ctrl = threading.Thread(target=control_loop, daemon=True); t_ctrl.start()
+    if args.server == 'async':
+        try:
+            run_async(HOST, PORT)
+        except Exception:
+            log.exception('server failed')
+        sys.exit(0)
     socketio.start_background_task(broadcaster)
     try:
         socketio.run(app, host=HOST, port=PORT, allow_unsafe_werkzeug=True)
@@ -0,0 +1,57 @@
+import sys
+import os
+prev_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(prev_dir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_socketio")
+
+import test_manual_control as manual
+
+TICKS = 120
+
+
+def record_session(directory):
+    """A short drive recorded the way control_loop and handle_input write it."""
+    rec = manual.InputRecorder(str(directory))
+    sett = dict(manual.state['settings'], record_inputs=True, smoothing_mode='alpha')
+    manual.state['settings'] = sett
+    rec.sync(sett)
+    t = 100.0
+    dt = 1.0 / manual.CONTROL_HZ
+    rec.settings(t, sett)
+    for i in range(TICKS):
+        t += dt
+        if i % 10 == 0:
+            forward, steer = (1.0, -0.5) if i < TICKS // 2 else (-0.3, 0.8)
+            with manual.publish_lock:
+                manual.apply_input(forward, steer, 1.0, False, t)
+            rec.input(t, i, forward, steer, 1.0, False)
+        elif i % 10 == 5:
+            with manual.publish_lock:
+                manual.apply_heartbeat(t)
+            rec.heartbeat(t)
+        targets = manual.state['targets']
+        out, angle_hw, speed_hw = manual.control_step(targets, sett, t, dt)
+        rec.output(t, dt, out.angle, out.speed, angle_hw, speed_hw, 0, targets.version)
+    path = rec.path
+    rec.close()
+    return path
+
+
+def test_replay_runs_on_sim_hw_without_camera(tmp_path):
+    path = record_session(tmp_path)
+
+    result = manual.replay(path, realtime=False)
+
+    assert result['inputs'] == TICKS // 10
+    assert result['ticks'] == TICKS
+    assert result['max_angle_err'] == 0
+    assert result['max_speed_err'] == 0
+    assert isinstance(manual.hw, manual.SimHW)
+    assert result['hw_writes'] == manual.hw.writes > 0
+    # nobody asked for video, so no camera was opened
+    assert manual.frames.cam is None
@@ -25,7 +25,8 @@ while True:
     try:
         frame = camera.capture_frame()
         frame = v.detect(frame)["debug"]["combined"]
-        config_city.debug_frame_buffer = frame
+        # the debug image is a pooled buffer reused next frame
+        config_city.debug_frame_buffer = frame.copy()
     except KeyboardInterrupt:
         break
     except Exception as e:
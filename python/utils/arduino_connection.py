@@ -13,6 +13,7 @@ class ArduinoConnection:
         self.max_retries = max_retries
         self.reboot_wait = reboot_wait
         self.serial_connection = None
+        self.closed = False # set by close(); readers stop then
         self.init_serial_connection()
 
     def init_serial_connection(self, reopen=False):
@@ -57,6 +58,10 @@ class ArduinoConnection:
                 time.sleep(0.1)
         return False
     
+    @property
+    def is_open(self):
+        return bool(self.serial_connection and self.serial_connection.is_open)
+
     def read_command(self):
         if self.serial_connection and self.serial_connection.is_open:
             return self.serial_connection.readline().decode("utf-8").strip()
@@ -64,6 +69,7 @@ class ArduinoConnection:
 
     
     def close(self):
+        self.closed = True
         if self.serial_connection:
             try:
                 self.serial_connection.close()
@@ -0,0 +1,102 @@
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWsgiServer:
+    """
+        Serves a WSGI app (the Flask tuning stream) from one asyncio event
+        loop with aiohttp instead of werkzeug's thread per connection.
+        Connections are held by the loop; the WSGI views (JPEG encode,
+        config save) run on a pool of max_concurrency threads, the rest
+        queue, so extra viewers never add threads and a slow view never
+        stalls the loop.
+
+        Needs aiohttp (optional dependency, imported on start).
+    """
+    def __init__(self, wsgi_app, host="0.0.0.0", port=5000, max_concurrency=8, stop_event=None):
+        self.wsgi_app = wsgi_app
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.stop_event = stop_event
+        self.served = 0
+
+    def _environ(self, request, body):
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": request.path,
+            "QUERY_STRING": request.query_string,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": "HTTP/%d.%d" % tuple(request.version),
+            "REMOTE_ADDR": request.remote or "",
+            "CONTENT_TYPE": request.headers.get("Content-Type", ""),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": request.scheme,
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name in set(request.headers.keys()):
+            key = "HTTP_" + name.upper().replace("-", "_")
+            if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+                environ[key] = ",".join(request.headers.getall(name))
+        return environ
+
+    def _call(self, environ):
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return started[0], started[1], body
+
+    async def _handle(self, request):
+        from aiohttp import web
+        from multidict import CIMultiDict
+
+        body = await request.read()
+        loop = asyncio.get_running_loop()
+        status, headers, data = await loop.run_in_executor(self._executor, self._call, self._environ(request, body))
+        self.served += 1
+        # aiohttp sets the framing headers itself
+        headers = CIMultiDict((k, v) for k, v in headers
+                              if k.lower() not in ("content-length", "transfer-encoding", "connection"))
+        return web.Response(status=int(status.split(" ", 1)[0]), headers=headers, body=data)
+
+    async def serve(self):
+        from aiohttp import web
+
+        self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="wsgi")
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        logger.info(f"async server on {self.host}:{self.port}")
+        try:
+            while self.stop_event is None or not self.stop_event.is_set():
+                await asyncio.sleep(0.2)
+        finally:
+            await runner.cleanup()
+            self._executor.shutdown(wait=False)
+
+    def run(self):
+        """Blocking; returns once stop_event is set."""
+        asyncio.run(self.serve())
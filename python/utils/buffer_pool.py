@@ -0,0 +1,66 @@
+import numpy as np
+
+from utils.profiler import profiler
+
+
+class BufferPool:
+    """
+        Reusable arrays for the per-frame pipeline, one per name. A request
+        returns a view of the named buffer with the asked shape; the buffer
+        only grows, so once every stage has seen its largest ROI the pool
+        stops allocating. OpenCV calls write into the views with dst=.
+
+        Not thread-safe: each processor owns its pool.
+    """
+    def __init__(self, name="pool"):
+        self.name = name
+        self.allocations = 0
+        self._buffers = {}
+        self._shared = {}
+
+    def get(self, key, shape, dtype=np.uint8):
+        shape = tuple(shape)
+        buf = self._buffers.get(key)
+        if buf is None or buf.dtype != dtype or buf.ndim != len(shape) \
+                or any(s > b for s, b in zip(shape, buf.shape)):
+            if buf is not None and buf.dtype == dtype and buf.ndim == len(shape):
+                shape_alloc = tuple(max(s, b) for s, b in zip(shape, buf.shape))
+            else:
+                shape_alloc = shape
+            buf = np.empty(shape_alloc, dtype=dtype)
+            self._buffers[key] = buf
+            self.allocations += 1
+            profiler.count(f"{self.name}.alloc")
+        if buf.shape == shape:
+            return buf
+        return buf[tuple(slice(0, s) for s in shape)]
+
+    def like(self, key, array):
+        return self.get(key, array.shape, array.dtype)
+
+    def shared(self, key, factory):
+        """Non-array resources built once per pool (e.g. an LSD detector)."""
+        obj = self._shared.get(key)
+        if obj is None:
+            obj = self._shared[key] = factory()
+        return obj
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+    def stats(self):
+        return {"buffers": len(self._buffers), "allocations": self.allocations, "bytes": self.nbytes()}
+
+
+def pooled(pool, key, shape, dtype=np.uint8):
+    """dst= argument for OpenCV: a pooled view, or None to let OpenCV allocate."""
+    if pool is None:
+        return None
+    return pool.get(key, shape, dtype)
+
+
+def pooled_copy(pool, key, array):
+    """Copy array into the pooled buffer key (array.copy() without the allocation)."""
+    dst = pool.like(key, array)
+    np.copyto(dst, array)
+    return dst
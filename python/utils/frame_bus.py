@@ -0,0 +1,88 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.profiler import profiler
+
+# header: sequence number, height, width, channels (int64 each)
+_HEADER = 4
+_HEADER_BYTES = _HEADER * 8
+
+
+class FrameBus:
+    """
+        Latest-frame slot in shared memory, for handing the debug frame to
+        the stream process without pickling it through a pipe.
+
+        One writer (the drive loop), any number of readers. The slot is a
+        seqlock: the writer makes the sequence odd, copies, makes it even
+        again and never waits on a reader; a reader retries when the
+        sequence moved under it. Frames larger than the slot are dropped.
+
+        The creating side owns the memory and unlinks it in close();
+        a reader attaches with FrameBus(name=...).
+    """
+    def __init__(self, max_shape=None, name=None):
+        if name is None:
+            size = _HEADER_BYTES + int(np.prod(max_shape))
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.header = np.ndarray((_HEADER,), dtype=np.int64, buffer=self.shm.buf[:_HEADER_BYTES])
+        self.data = np.ndarray((self.shm.size - _HEADER_BYTES,), dtype=np.uint8, buffer=self.shm.buf[_HEADER_BYTES:])
+        if self.owner:
+            self.header[:] = 0
+        self._seq = -1
+        self._frame = None
+
+    # --- writer ---
+    def publish(self, frame):
+        if frame is None or frame.dtype != np.uint8:
+            return False
+        if frame.size > self.data.size:
+            profiler.count("frame_bus.too_large")
+            return False
+        header = self.header
+        seq = int(header[0])
+        header[0] = seq + 1
+        shape = frame.shape + (1,) * (3 - frame.ndim)
+        header[1:] = shape
+        np.copyto(self.data[:frame.size].reshape(frame.shape), frame)
+        header[0] = seq + 2
+        return True
+
+    # --- reader ---
+    def latest(self, retries=3):
+        """
+            The last published frame, or None. While nothing new was
+            published the same array is returned, so callers can cache on
+            identity (the stream's JPEG cache does).
+        """
+        header = self.header
+        for _ in range(retries):
+            seq = int(header[0])
+            if seq == self._seq:
+                return self._frame
+            if seq == 0:
+                return None
+            if seq & 1:
+                continue
+            h, w, c = (int(v) for v in header[1:])
+            frame = self.data[:h * w * c].reshape((h, w, c) if c > 1 else (h, w)).copy()
+            if int(header[0]) == seq:
+                self._seq = seq
+                self._frame = frame
+                return frame
+        profiler.count("frame_bus.retry")
+        return self._frame
+
+    def close(self):
+        # drop the views before closing the mapping
+        self.header = self.data = None
+        self._frame = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# log-spaced buckets: 4 per doubling from 1us up to ~16s
+BUCKETS_PER_OCTAVE = 4
+NUM_BUCKETS = 24 * BUCKETS_PER_OCTAVE
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; recording is O(1) and never allocates."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        if us <= 1.0:
+            idx = 0
+        else:
+            idx = min(NUM_BUCKETS - 1, int(math.log2(us) * BUCKETS_PER_OCTAVE))
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @staticmethod
+    def bucket_upper(idx):
+        """Upper bound of a bucket in seconds."""
+        return 2 ** ((idx + 1) / BUCKETS_PER_OCTAVE) / 1e6
+
+    def percentile(self, p):
+        if self.count == 0:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self.bucket_upper(idx), self.max)
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p95_ms": self.percentile(95) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class _Span:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record(time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+        Named timing spans for the vision pipeline.
+        When disabled, span() returns a shared no-op context manager, so
+        instrumented code costs one attribute check per span.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        # event counters (e.g. buffer allocations); steady state should be flat
+        self.counters = {}
+        self._dump_path = None
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms.setdefault(name, Histogram())
+        return _Span(hist)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms.setdefault(name, Histogram())
+        hist.record(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        return {name: hist.summary() for name, hist in sorted(self.histograms.items())}
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump({"spans": self.summary(), "counters": dict(self.counters)}, f, indent=2)
+
+    def dump_at_exit(self, path):
+        """Write the summary to path when the process exits (registered once)."""
+        if self._dump_path is None:
+            atexit.register(self._dump_on_exit)
+        self._dump_path = path
+
+    def _dump_on_exit(self):
+        if not self.histograms and not self.counters:
+            return
+        try:
+            self.dump(self._dump_path)
+            logger.info(f"profile written to {self._dump_path}")
+        except Exception:
+            logger.exception("Failed writing profile")
+
+
+profiler = Profiler()
@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import threading
+import types
+
+import base_config as temp_conf
+
+logger = logging.getLogger(__name__)
+
+# module attributes that are runtime buffers, not configuration
+_EXCLUDED = {"debug_frame_buffer", "CONFIG_MODULE"}
+
+
+def _public_values(module):
+    values = {}
+    for name, value in vars(module).items():
+        if name.startswith("_") or name in _EXCLUDED:
+            continue
+        if isinstance(value, (types.ModuleType, types.FunctionType, type)):
+            continue
+        values[name] = value
+    return values
+
+
+def _coerce(name, old, new):
+    """Coerce an incoming value to the type of the value it replaces."""
+    if old is None:
+        return new
+    if isinstance(old, bool):
+        if isinstance(new, bool) or new in (0, 1):
+            return bool(new)
+        raise ValueError(f"{name} expects a bool, got {new!r}")
+    if isinstance(old, (int, float)):
+        if isinstance(new, bool) or not isinstance(new, (int, float)):
+            raise ValueError(f"{name} expects a number, got {new!r}")
+        # keep ints as ints (thresholds, speeds) unless a fraction comes in
+        if isinstance(old, int) and float(new).is_integer():
+            return int(new)
+        return float(new)
+    if isinstance(old, str):
+        if not isinstance(new, str):
+            raise ValueError(f"{name} expects a string, got {new!r}")
+        return new
+    return new
+
+
+class ConfigSnapshot:
+    """
+        Read-only view of a config module at one point in time.
+        Vision code grabs one snapshot per frame, so a reload in the middle
+        of a frame never mixes old and new values.
+    """
+    __slots__ = ("version", "_values", "_derived")
+
+    def __init__(self, values, version):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "_values", dict(values))
+        object.__setattr__(self, "_derived", {})
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is read-only")
+
+    def get(self, name, default=None):
+        return self._values.get(name, default)
+
+    def as_dict(self):
+        return dict(self._values)
+
+    def derived(self, key, factory):
+        """
+            Memoize a value computed from this snapshot. It is recomputed
+            only when a new snapshot (new config version) is taken.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = factory(self)
+            self._derived[key] = value
+            return value
+
+    def roi_bounds(self, prefix, width, height):
+        """Integer (top, bottom, left, right) pixel bounds of a *_ROI group."""
+        key = ("roi", prefix, width, height)
+        try:
+            return self._derived[key]
+        except KeyError:
+            bounds = (
+                int(self._values[f"{prefix}_TOP_ROI"] * height),
+                int(self._values[f"{prefix}_BOTTOM_ROI"] * height),
+                int(self._values[f"{prefix}_LEFT_ROI"] * width),
+                int(self._values[f"{prefix}_RIGHT_ROI"] * width),
+            )
+            self._derived[key] = bounds
+            return bounds
+
+
+class RuntimeConfig:
+    """
+        Owns the live values of one config module.
+        All edits go through update(), which writes the module attributes
+        (for legacy readers) and publishes a new snapshot in one swap.
+    """
+    def __init__(self, module):
+        self.module = module
+        self._lock = threading.Lock()
+        self._snapshot = ConfigSnapshot(_public_values(module), 0)
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def snapshot(self):
+        return self._snapshot
+
+    def get(self, name, default=None):
+        return self._snapshot.get(name, default)
+
+    def update(self, values):
+        """Apply a dict of new values. Returns the names that were changed."""
+        changed = {}
+        with self._lock:
+            current = self._snapshot.as_dict()
+            for name, value in values.items():
+                try:
+                    value = _coerce(name, current.get(name), value)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"ignoring config value: {e}")
+                    continue
+                if name in current and current[name] == value:
+                    continue
+                setattr(self.module, name, value)
+                current[name] = value
+                changed[name] = value
+            if changed:
+                self._snapshot = ConfigSnapshot(current, self._snapshot.version + 1)
+        return changed
+
+    def refresh(self):
+        """Re-read the module, for code that still assigns attributes directly."""
+        with self._lock:
+            values = _public_values(self.module)
+            if values != self._snapshot.as_dict():
+                self._snapshot = ConfigSnapshot(values, self._snapshot.version + 1)
+        return self._snapshot
+
+    def load_json(self, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{path} does not contain a JSON object")
+        return self.update(data)
+
+
+def save_json_atomic(path, data):
+    """Write JSON through a temp file so a watcher never reads half a file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+class ConfigFileWatcher(threading.Thread):
+    """Poll a JSON file and hot-reload it into a RuntimeConfig on change."""
+    def __init__(self, runtime, path, interval=1.0):
+        super().__init__(daemon=True)
+        self.runtime = runtime
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._mtime = self._stat()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check(self):
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return {}
+        try:
+            changed = self.runtime.load_json(self.path)
+        except (OSError, ValueError) as e:
+            # leave _mtime alone so the next poll retries
+            logger.warning(f"config reload of {self.path} failed: {e}")
+            return {}
+        self._mtime = mtime
+        if changed:
+            logger.info(f"reloaded {self.path}: {sorted(changed)}")
+        return changed
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_runtime_config(module=None):
+    """Return the shared RuntimeConfig for a config module (default: active mode)."""
+    if module is None:
+        module = temp_conf.CONFIG_MODULE if temp_conf.CONFIG_MODULE is not None else temp_conf
+    runtime = _registry.get(module.__name__)
+    if runtime is None:
+        with _registry_lock:
+            runtime = _registry.get(module.__name__)
+            if runtime is None:
+                runtime = RuntimeConfig(module)
+                _registry[module.__name__] = runtime
+    return runtime
@@ -1,20 +1,21 @@
 import cv2
 from cv2 import aruco
-import base_config as temp_conf
-
-if temp_conf.CONFIG_MODULE is not None:
-    conf = temp_conf.CONFIG_MODULE
-else:
-    conf = temp_conf
+from utils.runtime_config import get_runtime_config
+from vision.roi_geometry import roi_from_config, geometry_cache
+from utils.profiler import profiler
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+def apriltag_geometry(cfg, width, height):
+    return {"at": roi_from_config(cfg, "AT", width, height)}
+
 class ApriltagDetector:
-    def __init__(self):
+    def __init__(self, config_module=None):
         self.aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_APRILTAG_36h11)
         self.aruco_params = aruco.DetectorParameters()
+        self.config = get_runtime_config(config_module)
         logger.info("ArUco AprilTag 36h11 dictionary initialized")
 
     def detect(self, frame):
@@ -26,12 +27,11 @@ class ApriltagDetector:
         # -----------------------------
         # 1) Crop ROI from the frame
         # -----------------------------
-        x1 = int(conf.AT_LEFT_ROI * w)
-        y1 = int(conf.AT_TOP_ROI * h)
-        x2 = int(conf.AT_RIGHT_ROI * w)
-        y2 = int(conf.AT_BOTTOM_ROI * h)
+        geometry = geometry_cache.get("apriltag", self.config.snapshot(), w, h, apriltag_geometry)
+        at = geometry["at"]
+        y1, y2, x1, x2 = at
 
-        roi = frame[y1:y2, x1:x2]
+        roi = frame[at.slices]
 
         # -----------------------------
         # 2) Convert ROI to gray + threshold
@@ -44,11 +44,12 @@ class ApriltagDetector:
         # -----------------------------
         # 3) Detect markers **in ROI**
         # -----------------------------
-        corners, ids, _ = aruco.detectMarkers(
-            gray_thr, 
-            self.aruco_dict, 
-            parameters=self.aruco_params
-        )
+        with profiler.span("aruco"):
+            corners, ids, _ = aruco.detectMarkers(
+                gray_thr, 
+                self.aruco_dict, 
+                parameters=self.aruco_params
+            )
 
         detected_tags = []
 
@@ -7,6 +7,7 @@ except ImportError:
 from time import sleep
 import cv2
 import logging
+from utils.profiler import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -103,12 +104,14 @@ class Camera:
 
         try:
             if self.pi_mode:
-                frame = self.picam.capture_array()
+                with profiler.span("capture"):
+                    frame = self.picam.capture_array()
                 if frame is None or frame.size == 0:
                     logger.warning("Picamera2 returned empty frame")
                     return None
             else:
-                ret, frame = self.cap.read()
+                with profiler.span("capture"):
+                    ret, frame = self.cap.read()
                 if not ret or frame is None:
                     logger.warning("OpenCV camera returned no frame")
                     return None
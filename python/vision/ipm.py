@@ -0,0 +1,91 @@
+import math
+import cv2
+import numpy as np
+
+from utils.buffer_pool import pooled
+from vision.roi_geometry import Roi
+
+
+# --- Camera model ---
+# Pinhole camera at CAMERA_HEIGHT above a flat track, pitched down by
+# -CAMERA_PITCH_DEG, principal point at the image center. Ground points are
+# (X lateral, Y forward) in the same unit as CAMERA_HEIGHT / LANE_WIDTH.
+
+def _camera(cfg, width, height):
+    focal = (width / 2) / math.tan(math.radians(cfg.CAMERA_HFOV_DEG) / 2)
+    pitch = math.radians(-cfg.CAMERA_PITCH_DEG)
+    return focal, width / 2, height / 2, pitch
+
+
+def _ground_distance(row, focal, cy, pitch, camera_height, max_distance):
+    """Forward distance of the ground point seen at an image row."""
+    t = (row - cy) / focal
+    denom = math.sin(pitch) + t * math.cos(pitch)
+    if denom <= 0:
+        return max_distance
+    return min(max_distance, camera_height * (math.cos(pitch) - t * math.sin(pitch)) / denom)
+
+
+def ipm_geometry(cfg, width, height):
+    """
+        Remap tables that warp the bottom band of the frame to a top-down
+        view, plus the image x of every bird's-eye column on the lane ROI
+        row so lane positions stay in the units steering already uses.
+    """
+    focal, cx, cy, pitch = _camera(cfg, width, height)
+    h_cam = cfg.CAMERA_HEIGHT
+    band = Roi(int(cfg.IPM_TOP_ROI * height), height, 0, width)
+
+    near = _ground_distance(height - 1, focal, cy, pitch, h_cam, cfg.IPM_MAX_DISTANCE)
+    far = _ground_distance(band.top, focal, cy, pitch, h_cam, cfg.IPM_MAX_DISTANCE)
+
+    out_w, out_h = cfg.IPM_WIDTH, cfg.IPM_HEIGHT
+    lateral = np.linspace(-cfg.IPM_LATERAL, cfg.IPM_LATERAL, out_w, dtype=np.float32)
+    forward = np.linspace(far, near, out_h, dtype=np.float32)
+    X, Y = np.meshgrid(lateral, forward)
+
+    # world -> camera -> pixel, v relative to the band
+    y_c = h_cam * math.cos(pitch) - Y * math.sin(pitch)
+    z_c = Y * math.cos(pitch) + h_cam * math.sin(pitch)
+    map_x = (cx + focal * X / z_c).astype(np.float32)
+    map_y = (cy + focal * y_c / z_c - band.top).astype(np.float32)
+    map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    # lanes are reported where the Hough engine measures them: the middle
+    # row of the right lane ROI
+    ref_row = (cfg.RL_TOP_ROI + cfg.RL_BOTTOM_ROI) / 2 * height
+    ref_y = _ground_distance(ref_row, focal, cy, pitch, h_cam, cfg.IPM_MAX_DISTANCE)
+    ref_z = ref_y * math.cos(pitch) + h_cam * math.sin(pitch)
+
+    return {
+        "band": band,
+        "map1": map1,
+        "map2": map2,
+        "column_x": cx + focal * lateral / ref_z,
+        "near": near,
+        "far": far,
+    }
+
+
+def find_lanes(frame, cfg, geometry, pool=None):
+    """
+        Warp the band, threshold it and take a column histogram of the near
+        half. Returns (left_x, right_x, birdseye) with x in image pixels, or
+        None for a lane without a strong enough peak.
+    """
+    band = frame[geometry["band"].slices]
+    gray = cv2.cvtColor(band, cv2.COLOR_BGR2GRAY, dst=pooled(pool, "ipm.gray", band.shape[:2]))
+    birdseye = cv2.remap(gray, geometry["map1"], geometry["map2"], cv2.INTER_LINEAR,
+                         dst=pooled(pool, "ipm.birdseye", geometry["map1"].shape[:2]),
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    _, birdseye = cv2.threshold(birdseye, cfg.LANE_THRESHOLD, 255, cv2.THRESH_BINARY, dst=birdseye)
+
+    hist = np.count_nonzero(birdseye[birdseye.shape[0] // 2:], axis=0)
+    mid = hist.shape[0] // 2
+
+    left = int(np.argmax(hist[:mid]))
+    right = mid + int(np.argmax(hist[mid:]))
+    column_x = geometry["column_x"]
+    left_x = float(column_x[left]) if hist[left] >= cfg.IPM_MIN_PEAK else None
+    right_x = float(column_x[right]) if hist[right] >= cfg.IPM_MIN_PEAK else None
+    return left_x, right_x, birdseye
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+
+from vision.lane_histogram import lane_windows
+
+
+class LaneCurve:
+    """
+        Second-order fit x = a*y^2 + b*y + c of one lane line over a tall
+        band. x is in band pixels, y is normalised to 0 (band top) .. 1
+        (band bottom) to keep the normal equations well conditioned.
+        The previous frame's coefficients pick the pixels to fit (a margin
+        around the old curve) and pull the new fit towards them, so a
+        clean frame costs one masked nonzero + one 3x3 solve.
+    """
+    def __init__(self):
+        self.coeffs = None
+
+    def reset(self):
+        self.coeffs = None
+
+    def _pixels(self, binary, cfg):
+        height = binary.shape[0]
+        ys, xs = np.nonzero(binary)
+        if ys.size == 0:
+            return ys, xs
+
+        if self.coeffs is not None:
+            yn = ys / float(height)
+            predicted = (self.coeffs[0] * yn + self.coeffs[1]) * yn + self.coeffs[2]
+            keep = np.abs(xs - predicted) < cfg.CURVE_MARGIN
+            return ys[keep], xs[keep]
+
+        # cold start: sliding windows decide which pixels belong to the lane
+        x_mid, windows = lane_windows(binary, cfg.CURVE_WINDOWS, cfg.CURVE_MARGIN, cfg.HIST_MIN_PIXELS)
+        if x_mid is None:
+            return ys[:0], xs[:0]
+        keep = np.zeros(ys.shape[0], dtype=bool)
+        for top, bottom, left, right in windows:
+            keep |= (ys >= top) & (ys < bottom) & (xs >= left) & (xs < right)
+        return ys[keep], xs[keep]
+
+    def fit(self, binary, cfg):
+        """Fit the lane in a binary band; returns the coefficients or None."""
+        if binary is None:
+            self.reset()
+            return None
+        ys, xs = self._pixels(binary, cfg)
+        if ys.shape[0] < cfg.CURVE_MIN_PIXELS:
+            self.reset()
+            return None
+
+        yn = ys / float(binary.shape[0])
+        A = np.stack((yn * yn, yn, np.ones_like(yn)), axis=1)
+        ata = A.T @ A
+        atb = A.T @ xs.astype(np.float64)
+        if self.coeffs is not None and cfg.CURVE_SMOOTHING > 0:
+            # ridge towards last frame's curve, scaled with the pixel count
+            weight = cfg.CURVE_SMOOTHING * ys.shape[0]
+            ata += weight * np.eye(3)
+            atb += weight * self.coeffs
+        try:
+            self.coeffs = np.linalg.solve(ata, atb)
+        except np.linalg.LinAlgError:
+            self.reset()
+        return self.coeffs
+
+    def x_at(self, yn):
+        if self.coeffs is None:
+            return None
+        return float((self.coeffs[0] * yn + self.coeffs[1]) * yn + self.coeffs[2])
+
+    def draw(self, vis, offset_x, offset_y, band_h, color=(0, 255, 255)):
+        if self.coeffs is None:
+            return
+        yn = np.linspace(0, 1, 12)
+        xs = (self.coeffs[0] * yn + self.coeffs[1]) * yn + self.coeffs[2]
+        points = np.stack((xs + offset_x, yn * band_h + offset_y), axis=1).astype(np.int32)
+        cv2.polylines(vis, [points], False, color, 2)
@@ -0,0 +1,782 @@
+import logging
+import math
+import cv2
+import numpy as np
+
+from utils.runtime_config import get_runtime_config
+from utils.profiler import profiler
+from utils.buffer_pool import BufferPool, pooled, pooled_copy
+from vision.roi_geometry import Roi, roi_from_config, geometry_cache
+from vision.lane_tracker import LaneTracker
+from vision.lane_histogram import find_lane_x, draw_windows
+from vision.lane_curve import LaneCurve
+from vision.ipm import ipm_geometry, find_lanes
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Geometry
+# =========================
+
+def expected_lane_angle(side, h, lane_width, camera_pitch_deg):
+
+    camera_pitch = math.radians(camera_pitch_deg)
+
+    Yp = h / math.tan(-camera_pitch)
+
+    alpha = math.degrees(math.atan((lane_width / 2) / Yp))
+
+    if side == "right":
+        return 90 + alpha
+    else:
+        return 90 - alpha
+
+
+def lane_angle_targets(cfg):
+    # derived from camera geometry, recomputed only when the config changes
+    return {
+        side: expected_lane_angle(side, cfg.CAMERA_HEIGHT, cfg.LANE_WIDTH, cfg.CAMERA_PITCH_DEG)
+        for side in ("left", "right")
+    }
+
+
+def widening_lane_geometry(cfg, width, height, rroi_unseen, lroi_unseen, max_unseen):
+    rl_top, rl_bottom, rl_left, rl_right = cfg.roi_bounds("RL", width, height)
+    ll_top, ll_bottom, ll_left, ll_right = cfg.roi_bounds("LL", width, height)
+
+    # widen the outer edge of a lane ROI while that lane is not seen
+    rl_right += int((1 - cfg.RL_RIGHT_ROI) * width * 1 / max_unseen * rroi_unseen)
+    ll_left += int((0 - cfg.LL_LEFT_ROI) * width *1 / max_unseen * lroi_unseen)
+
+    cw = roi_from_config(cfg, "CW", width, height)
+    cw_roi_diagonal = math.sqrt(math.pow(cw.width, 2) + math.pow(cw.height, 2))
+
+    frame_center = (ll_left + rl_right) / 2
+    min_error = frame_center - (ll_right + rl_right) / 2
+    max_error = frame_center - (ll_left + rl_left) / 2
+    return {
+        "rl": Roi(rl_top, rl_bottom, rl_left, rl_right),
+        "ll": Roi(ll_top, ll_bottom, ll_left, ll_right),
+        "cw": cw,
+        # number of pixels distance before horizontal line of crosswalk
+        "cw_pixel_dist": (4 / 5) * cw.height,
+        "cw_line_min_length": max(cw_roi_diagonal / 20, 10),
+        "frame_center": frame_center,
+        "min_error": min_error,
+        "max_error": max_error,
+        # steering gains for errors right (<0) and left (>0) of center
+        "kp_right": (180 - cfg.SERVO_CENTER) / abs(min_error) if min_error else 0,
+        "kp_left": cfg.SERVO_CENTER / abs(max_error) if max_error else 0,
+    }
+
+
+def fixed_lane_geometry(cfg, width, height):
+    return {
+        "rl": roi_from_config(cfg, "RL", width, height),
+        "ll": roi_from_config(cfg, "LL", width, height),
+        "cw": roi_from_config(cfg, "CW", width, height),
+        "frame_center": (width * (cfg.RL_RIGHT_ROI + cfg.LL_LEFT_ROI) / 2),
+    }
+
+
+def curve_geometry(cfg, width, height):
+    rl = roi_from_config(cfg, "RL", width, height)
+    ll = roi_from_config(cfg, "LL", width, height)
+    # curve engine: same columns as the lane ROIs, taller band
+    curve_top = int(cfg.CURVE_TOP_ROI * height)
+    rl_curve = Roi(min(curve_top, rl.top), rl.bottom, rl.left, rl.right)
+    ll_curve = Roi(min(curve_top, ll.top), ll.bottom, ll.left, ll.right)
+    look_row = cfg.CURVE_LOOKAHEAD_ROI * height
+    return {
+        "rl_curve": rl_curve,
+        "ll_curve": ll_curve,
+        # look-ahead row as a fraction of each band (0 top .. 1 bottom)
+        "rl_lookahead": (look_row - rl_curve.top) / max(1, rl_curve.height),
+        "ll_lookahead": (look_row - ll_curve.top) / max(1, ll_curve.height),
+        "lookahead_row": int(look_row),
+    }
+
+
+def lane_type_of(rl_x, ll_x):
+    if rl_x is not None and ll_x is not None:
+        return "both"
+    if ll_x is not None:
+        return "only_left"
+    if rl_x is not None:
+        return "only_right"
+    return "none"
+
+
+# =========================
+# Preprocess: BGR ROI -> edges for line extraction
+# =========================
+
+# pool/key: write every intermediate into pooled buffers named key.*
+
+def binary_roi(roi, threshold, pool=None, key=""):
+    shape = roi.shape[:2]
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=pooled(pool, f"{key}.gray", shape))
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY, dst=gray)
+    return binary
+
+
+def canny_edges(roi, threshold, pool=None, key=""):
+    binary = binary_roi(roi, threshold, pool, key)
+    return cv2.Canny(binary, 100, 150, edges=pooled(pool, f"{key}.edges", binary.shape))
+
+
+def morph_canny_edges(roi, threshold, pool=None, key=""):
+    binary = binary_roi(roi, threshold, pool, key)
+    blurred = cv2.GaussianBlur(binary, (5, 5), 0, dst=pooled(pool, f"{key}.work", binary.shape))
+    # dilate then erode to close gaps in the marks
+    dilated = cv2.dilate(blurred, None, dst=binary, iterations=1)
+    eroded = cv2.erode(dilated, None, dst=blurred, iterations=1)
+    return cv2.Canny(eroded, 50, 100, edges=pooled(pool, f"{key}.edges", binary.shape))
+
+
+def hough_lines(edges):
+    with profiler.span("hough"):
+        return cv2.HoughLinesP(edges, 1, np.pi/180, threshold=20,
+                               minLineLength=5, maxLineGap=5)
+
+
+# =========================
+# Lane selection: Hough segments -> lane x (ROI coordinates)
+# =========================
+
+def select_scored(lines, roi, side, cfg, gate=None):
+    # gate: (x, half_width) in ROI coordinates around the tracked lane,
+    # segments whose midpoint falls outside it are not scored at all
+    if lines is None:
+        return None
+
+    angle_targets = cfg.derived("lane_angle_targets", lane_angle_targets)
+    roi_w, roi_h = roi.width, roi.height
+    roi_w_center = roi_w / 2
+    roi_h_bottom = roi_h
+    max_length = math.sqrt(math.pow(roi_w,2)+math.pow(roi_h,2))
+
+    def angle_target_score(angle, target_angle, sigma=15):
+        diff = abs(angle - target_angle)
+        return math.exp(-(diff ** 2) / (2 * sigma ** 2))
+
+    best_x_mid = None
+    best_score = -1
+
+    for line in lines:
+        x1, y1, x2, y2 = line[0]
+
+        x_mid = (x1 + x2) / 2
+        if gate is not None and abs(x_mid - gate[0]) > gate[1]:
+            continue
+
+        slope = (y2 - y1) / (x2 - x1 + 1e-9)
+        angle = abs(math.degrees(math.atan(slope)))
+
+        length = math.hypot(x2 - x1, y2 - y1)
+
+        y_mid = (y1 + y2) / 2
+
+        norm_length = min(length / max_length , 1)
+        norm_x_dist = min(abs(x_mid - roi_w_center) / roi_w_center, 1)
+        norm_y = min(y_mid / roi_h_bottom, 1)
+
+        if side in ("left", "right"):
+            angle_score = angle_target_score(angle, angle_targets[side], sigma=20)
+        else:
+            angle_score = angle_target_score(angle, 90, sigma=25)
+
+        score = (
+            0.4 * norm_length +
+            0.3 * (1 - norm_x_dist) +
+            0.2 * norm_y +
+            0.1 * angle_score
+        )
+
+        if score > best_score:
+            best_x_mid = x_mid
+            best_score = score
+
+    return best_x_mid
+
+
+def select_longest(lines, roi, side, cfg, gate=None):
+    if lines is None:
+        return None
+    max_length = 0
+    x_mid = None
+    for line in lines:
+        x1, y1, x2, y2 = line[0]
+        if x1 == x2:
+            continue
+        slope = (y2 - y1) / (x2 - x1 + 1e-9)
+        if abs(slope) > 0.1:
+            length = math.hypot(x2 - x1, y2 - y1)
+            if length > max_length:
+                max_length = length
+                x_mid = (x1 + x2) / 2.0
+    return x_mid
+
+
+# =========================
+# Steering laws: error -> servo angle (before clamping)
+# =========================
+
+def servo_gain_steering(cfg, geometry, error, lane_type):
+    # gains scaled so the largest possible error hits the servo end stop
+    if error < 0:
+        kp = geometry["kp_right"]
+    elif error > 0:
+        kp = geometry["kp_left"]
+    else:
+        kp = 0
+
+    if cfg.SERVO_DIRECTION == "rtl":
+        return cfg.SERVO_CENTER + kp * error
+    # default assume ltr
+    return cfg.SERVO_CENTER - kp * error
+
+
+def two_gain_steering(cfg, geometry, error, lane_type):
+    kp = cfg.LOW_KP if abs(error) < 25 else cfg.HIGH_KP
+    if lane_type == "none":
+        return 150
+    return 90.0 - kp * error
+
+
+# =========================
+# Crosswalk: BGR crosswalk ROI -> (crosswalk, lines to draw)
+# =========================
+
+def crosswalk_prefilter(binary, geometry):
+    """
+        Cheap necessary conditions of the LSD check below, all numpy
+        reductions on the thresholded crosswalk ROI:
+          - white reaching the rows where the lowest horizontal line must lie
+          - LSD runs on the Canny edges of this image and finds both sides
+            of an edge, so more than 3 vertical and 3 horizontal segments of
+            cw_line_min_length need at least two edges that long in each
+            direction; at <= 30 deg off axis each spans 0.87 of its length
+            in pixel transitions
+        Frames failing it cannot pass LSD. Stripe shape is not tested: a
+        lane line through the ROI or stripes cut by its border can still
+        be an LSD positive.
+    """
+    # LSD endpoints are subpixel, keep a row of slack
+    low_rows = binary[max(0, int(geometry["cw_pixel_dist"]) - 2):]
+    if np.count_nonzero(low_rows) == 0:
+        return False
+
+    min_transitions = 2 * 0.85 * geometry["cw_line_min_length"]
+    if np.count_nonzero(binary[:, 1:] != binary[:, :-1]) < min_transitions:
+        return False
+    return np.count_nonzero(binary[1:] != binary[:-1]) >= min_transitions
+
+
+def lsd_crosswalk(cw_frame, cfg, geometry, threshold, pool=None):
+    binary = binary_roi(cw_frame, threshold, pool, "cw")
+    if cfg.CROSSWALK_PREFILTER and not crosswalk_prefilter(binary, geometry):
+        profiler.count("crosswalk.prefiltered")
+        return False, []
+    edges = cv2.Canny(binary, 100, 150, edges=pooled(pool, "cw.edges", binary.shape))
+
+    with profiler.span("lsd"):
+        if pool is not None:
+            lsd = pool.shared("lsd", lambda: cv2.createLineSegmentDetector(0))
+        else:
+            lsd = cv2.createLineSegmentDetector(0)
+        lines, _, _, _ = lsd.detect(edges)
+
+    vertical = 0
+    horizontal = 0
+    cw_lines = []
+    crosswalk_pixel_dist = geometry["cw_pixel_dist"]
+    line_min_length = geometry["cw_line_min_length"]
+    lowest_horizontal_line = None
+    if lines is not None:
+        for line in lines:
+            x0, y0, x1, y1 = line[0]
+            slope = (y1 - y0) / (x1 - x0 + 1e-6)
+            angle = abs(np.arctan(slope) * 180 / np.pi)
+            length = math.hypot(x1 - x0, y1 - y0)
+
+            if length >= line_min_length:
+
+                if angle <= 30:
+                    horizontal += 1
+                    cw_lines.append(line)
+                    if lowest_horizontal_line is not None:
+                        if max(y0, y1) > max(lowest_horizontal_line[0][1],lowest_horizontal_line[0][3]):
+                            lowest_horizontal_line = line
+                    else:
+                        lowest_horizontal_line = line
+
+                elif angle >= 60:
+                    vertical += 1
+                    cw_lines.append(line)
+
+    crosswalk = False
+    if vertical > 3 and horizontal > 3:
+        if lowest_horizontal_line is not None:
+            if max(lowest_horizontal_line[0][1],lowest_horizontal_line[0][3]) > crosswalk_pixel_dist:
+                crosswalk = True
+    return crosswalk, cw_lines
+
+
+def hough_crosswalk(cw_frame, cfg, geometry, threshold, pool=None):
+    edges = morph_canny_edges(cw_frame, threshold, pool, "cw")
+    with profiler.span("crosswalk.hough"):
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=20,
+                                minLineLength=5, maxLineGap=5)
+
+    vertical = 0
+    horizontal = 0
+    cw_lines = []
+    if lines is not None:
+        for line in lines:
+            x0, y0, x1, y1 = line[0]
+            slope = (y1 - y0) / (x1 - x0 + 1e-6)
+            angle = abs(np.arctan(slope) * 180 / np.pi)
+
+            if angle < 30:
+                horizontal += 1
+                cw_lines.append(line)
+            elif angle > 60:
+                vertical += 1
+                cw_lines.append(line)
+
+    return vertical > 2 and horizontal > 2, cw_lines
+
+
+# =========================
+# Presets
+# =========================
+# One entry per drive mode, reproducing what each mode's processor did.
+# Thresholds of None come from the config (LANE_THRESHOLD/CROSSWALK_THRESHOLD).
+# Which lane finder runs ("hough", "histogram", "ipm", "curve") is the
+# runtime LANE_ENGINE setting; ipm needs the camera/IPM_* keys of
+# config_city, curve the CURVE_* keys of config_race. A finder whose keys
+# the mode's config lacks falls back to hough with a warning.
+# Tracking and adaptive ROIs are city only: the other presets keep
+# "tracking" off and their configs have no LANE_TRACKING/ADAPTIVE_ROI_*.
+
+# config keys each lane finder reads besides the common ones
+FINDER_KEYS = {
+    "hough": (),
+    "histogram": ("HIST_WINDOWS", "HIST_MARGIN", "HIST_MIN_PIXELS"),
+    "ipm": ("CAMERA_HEIGHT", "CAMERA_HFOV_DEG", "CAMERA_PITCH_DEG", "IPM_TOP_ROI", "IPM_LATERAL",
+            "IPM_MAX_DISTANCE", "IPM_WIDTH", "IPM_HEIGHT", "IPM_MIN_PEAK"),
+    "curve": ("CURVE_TOP_ROI", "CURVE_LOOKAHEAD_ROI", "CURVE_WINDOWS", "CURVE_MARGIN",
+              "CURVE_MIN_PIXELS", "CURVE_SMOOTHING", "HIST_MIN_PIXELS"),
+}
+
+
+def lane_finder_name(cfg):
+    """LANE_ENGINE if this config can run it, else "hough"."""
+    engine = cfg.LANE_ENGINE
+    if engine not in FINDER_KEYS:
+        logger.warning(f"unknown LANE_ENGINE {engine!r}, using hough")
+        return "hough"
+    missing = [key for key in FINDER_KEYS[engine] if cfg.get(key) is None]
+    if missing:
+        logger.warning(f"LANE_ENGINE {engine!r} needs {', '.join(missing)}, using hough")
+        return "hough"
+    return engine
+
+PRESETS = {
+    "city": {
+        "geometry": widening_lane_geometry,
+        "unseen_widening": True,
+        "tracking": True,
+        "lane_threshold": None,
+        "preprocess": canny_edges,
+        "select": select_scored,
+        "steering": servo_gain_steering,
+        "crosswalk": lsd_crosswalk,
+        "crosswalk_threshold": None,
+        "only_left_shift": 0,
+        "right_fallback_offset": 5,
+        "draw_flags": ("DEBUG", "STREAM"),
+        "result_extras": {},
+    },
+    "race": {
+        "geometry": fixed_lane_geometry,
+        "unseen_widening": False,
+        "tracking": False,
+        "lane_threshold": 220,
+        "preprocess": canny_edges,
+        "select": select_longest,
+        "steering": two_gain_steering,
+        "crosswalk": None,
+        "crosswalk_threshold": None,
+        "only_left_shift": 20,
+        "right_fallback_offset": 0,
+        "draw_flags": ("DEBUG",),
+        "result_extras": {},
+    },
+    "main": {
+        "geometry": fixed_lane_geometry,
+        "unseen_widening": False,
+        "tracking": False,
+        "lane_threshold": 230,
+        "preprocess": morph_canny_edges,
+        "select": select_longest,
+        "steering": two_gain_steering,
+        "crosswalk": hough_crosswalk,
+        "crosswalk_threshold": 230,
+        "only_left_shift": 20,
+        "right_fallback_offset": 0,
+        "draw_flags": ("DEBUG",),
+        # main's result always carried this key (never filled in)
+        "result_extras": {"crosswalk_debug": None},
+    },
+}
+
+
+# =========================
+# Engine
+# =========================
+
+class LaneEngine:
+    """
+        Lane processing for every drive mode: ROI geometry -> lane finder
+        (preprocess + line extraction + lane selection, or one of the
+        histogram/ipm/curve finders) -> tracking -> steering law, plus the
+        crosswalk check and debug drawing. A preset picks the stages;
+        everything else is shared, as are the geometry cache and profiler
+        spans.
+    """
+    def __init__(self, config_module, preset):
+        self.config = get_runtime_config(config_module)
+        self.mode = preset
+        self.preset = PRESETS[preset]
+        self.name = f"{preset}_lane"
+        self.last_steering = self.config.get("SERVO_CENTER", 90)
+        self.geometry = None
+        # reusable per-frame arrays, see utils/buffer_pool.py
+        self.buffers = BufferPool(f"{preset}_buffers")
+
+        # ROI widening while a lane is unseen (city)
+        self.rroi_unseen_counter = 0
+        self.lroi_unseen_counter = 0
+        self.max_unseen_counter = 10
+
+        # per-lane Kalman trackers (LANE_TRACKING), full-frame x coordinates
+        self.rl_tracker = LaneTracker()
+        self.ll_tracker = LaneTracker()
+        self._tracker_version = None
+
+        # per-lane polynomial fits (LANE_ENGINE = "curve")
+        self.rl_curve = LaneCurve()
+        self.ll_curve = LaneCurve()
+
+    # --- tracking ---
+
+    def _tracking(self, cfg):
+        return self.preset["tracking"] and cfg.LANE_TRACKING
+
+    def _predict_lanes(self, cfg):
+        """Advance the lane trackers; returns (x, gate half-width) or None per lane."""
+        if not self._tracking(cfg):
+            if self.rl_tracker.active or self.ll_tracker.active:
+                self.rl_tracker.reset()
+                self.ll_tracker.reset()
+            return None, None
+
+        if self._tracker_version != cfg.version:
+            self.rl_tracker.configure(cfg)
+            self.ll_tracker.configure(cfg)
+            self._tracker_version = cfg.version
+
+        predictions = []
+        for tracker in (self.rl_tracker, self.ll_tracker):
+            predicted = tracker.predict()
+            predictions.append(None if predicted is None else (predicted, tracker.gate()))
+        return predictions[0], predictions[1]
+
+    def _adaptive_roi(self, cfg, roi, tracker, predicted):
+        # a confident lane that was seen last frame only needs a band around
+        # its prediction; any miss or drop in confidence restores the full ROI
+        if predicted is None or not cfg.ADAPTIVE_ROI or tracker.coast > 0:
+            return roi
+        if tracker.confidence < cfg.ADAPTIVE_ROI_MIN_CONFIDENCE:
+            return roi
+        return roi.narrowed(predicted[0], predicted[1] + cfg.ADAPTIVE_ROI_MARGIN)
+
+    def _update_unseen(self, lane_type):
+        if not self.preset["unseen_widening"]:
+            return
+        if lane_type == "both":
+            self.rroi_unseen_counter -= 1
+            self.lroi_unseen_counter -= 1
+        elif lane_type == "only_left":
+            self.rroi_unseen_counter += 2
+        elif lane_type == "only_right":
+            self.lroi_unseen_counter += 2
+        else:
+            self.rroi_unseen_counter += 2
+            self.lroi_unseen_counter += 2
+
+        self.rroi_unseen_counter = max(0, min(self.max_unseen_counter, self.rroi_unseen_counter))
+        self.lroi_unseen_counter = max(0, min(self.max_unseen_counter, self.lroi_unseen_counter))
+
+    # --- lane finders, all return (rl_x, ll_x) in frame coordinates ---
+
+    def _find_hough(self, frame, cfg, rl, ll, gates, lanes):
+        threshold = self.preset["lane_threshold"] or cfg.LANE_THRESHOLD
+        found = []
+        for side, roi, gate, lane in (("right", rl, gates[0], lanes["rl"]), ("left", ll, gates[1], lanes["ll"])):
+            crop = roi.crop(frame)
+            if crop is None:
+                found.append(None)
+                continue
+            with profiler.span(f"process_roi.{side[0]}l"):
+                edges = self.preset["preprocess"](crop, threshold, self.buffers, side)
+                lane["lines"] = hough_lines(edges)
+            with profiler.span("lane_select"):
+                x_mid = self.preset["select"](lane["lines"], roi, side, cfg, gate)
+            found.append(roi.left + x_mid if x_mid is not None else None)
+        return found[0], found[1]
+
+    def _find_histogram(self, frame, cfg, rl, ll, gates, lanes):
+        # threshold + column histogram + sliding windows, no Canny/Hough;
+        # a tracked lane only looks for its starting column inside the gate
+        threshold = self.preset["lane_threshold"] or cfg.LANE_THRESHOLD
+        found = []
+        with profiler.span("histogram"):
+            for key, roi, gate in (("rl", rl, gates[0]), ("ll", ll, gates[1])):
+                base_range = (gate[0] - gate[1], gate[0] + gate[1] + 1) if gate else None
+                x_mid, _, lanes[key]["windows"] = find_lane_x(roi.crop(frame), threshold, cfg, base_range,
+                                                               self.buffers, key)
+                found.append(roi.left + x_mid if x_mid is not None else None)
+        return found[0], found[1]
+
+    def _find_ipm(self, frame, cfg, rl, ll, gates, lanes):
+        # bird's-eye remap of the bottom band, column histogram
+        ipm = geometry_cache.get(f"{self.mode}_ipm", cfg, frame.shape[1], frame.shape[0], ipm_geometry)
+        with profiler.span("ipm"):
+            left_x, right_x, lanes["birdseye"] = find_lanes(frame, cfg, ipm, self.buffers)
+        lanes["ipm_pixels"] = ipm["band"].area
+        return right_x, left_x
+
+    def _find_curve(self, frame, cfg, rl, ll, gates, lanes):
+        # quadratic fit over a taller band, evaluated at the look-ahead row
+        curves = geometry_cache.get(f"{self.mode}_curve", cfg, frame.shape[1], frame.shape[0], curve_geometry)
+        lanes["curves"] = curves
+        threshold = self.preset["lane_threshold"] or cfg.LANE_THRESHOLD
+        found = []
+        with profiler.span("curve"):
+            for key, curve in (("rl", self.rl_curve), ("ll", self.ll_curve)):
+                band = curves[f"{key}_curve"]
+                crop = band.crop(frame)
+                binary = binary_roi(crop, threshold, self.buffers, key) if crop is not None else None
+                curve.fit(binary, cfg)
+                x = curve.x_at(curves[f"{key}_lookahead"])
+                found.append(band.left + x if x is not None else None)
+        return found[0], found[1]
+
+    # --- per frame ---
+
+    def _geometry(self, cfg, width, height):
+        # ROI pixel bounds, cached per frame size/config/unseen state
+        state = ()
+        if self.preset["unseen_widening"]:
+            state = (self.rroi_unseen_counter, self.lroi_unseen_counter, self.max_unseen_counter)
+        return geometry_cache.get(self.name, cfg, width, height, self.preset["geometry"], state=state)
+
+    def _crosswalk(self, frame, cfg, geometry):
+        cw_frame = geometry["cw"].crop(frame) if self.preset["crosswalk"] is not None else None
+        if cw_frame is None:
+            return False, []
+        threshold = self.preset["crosswalk_threshold"] or cfg.CROSSWALK_THRESHOLD
+        with profiler.span("crosswalk"):
+            return self.preset["crosswalk"](cw_frame, cfg, geometry, threshold, self.buffers)
+
+    def detect_crosswalk(self, frame):
+        """Crosswalk check alone, for loops that schedule it apart from detect()."""
+        cfg = self.config.snapshot()
+        geometry = self._geometry(cfg, frame.shape[1], frame.shape[0])
+        return self._crosswalk(frame, cfg, geometry)[0]
+
+    def crosswalk_trigger(self, frame):
+        """
+            Cheap hint that a crosswalk may be in view: share of bright
+            pixels in the crosswalk ROI, sampled on every 4th pixel of the
+            green channel, against CROSSWALK_TRIGGER_RATIO (0 disables).
+        """
+        cfg = self.config.snapshot()
+        ratio = cfg.get("CROSSWALK_TRIGGER_RATIO", 0)
+        if not ratio or self.preset["crosswalk"] is None:
+            return False
+        geometry = self._geometry(cfg, frame.shape[1], frame.shape[0])
+        cw_frame = geometry["cw"].crop(frame)
+        if cw_frame is None:
+            return False
+        sample = cw_frame[::4, ::4, 1]
+        threshold = self.preset["crosswalk_threshold"] or cfg.CROSSWALK_THRESHOLD
+        return np.count_nonzero(sample >= threshold) >= ratio * sample.size
+
+    def detect(self, frame, with_crosswalk=True):
+        height, width = frame.shape[:2]
+        # one snapshot per frame: a hot reload never tears mid-frame
+        cfg = self.config.snapshot()
+        preset = self.preset
+
+        geometry = self._geometry(cfg, width, height)
+        self.geometry = geometry
+
+        rl_predicted, ll_predicted = self._predict_lanes(cfg)
+        rl = self._adaptive_roi(cfg, geometry["rl"], self.rl_tracker, rl_predicted)
+        ll = self._adaptive_roi(cfg, geometry["ll"], self.ll_tracker, ll_predicted)
+        cw = geometry["cw"]
+        # trackers predict in frame coordinates, lane finders work per ROI
+        gates = (
+            (rl_predicted[0] - rl.left, rl_predicted[1]) if rl_predicted else None,
+            (ll_predicted[0] - ll.left, ll_predicted[1]) if ll_predicted else None,
+        )
+
+        # --- Lane finder ---
+        # checked once per config version
+        engine = cfg.derived("lane_finder", lane_finder_name)
+        finder = {
+            "histogram": self._find_histogram,
+            "ipm": self._find_ipm,
+            "curve": self._find_curve,
+        }.get(engine, self._find_hough)
+        lanes = {"rl": {"lines": None, "windows": []}, "ll": {"lines": None, "windows": []}}
+        rl_x_mid_full, ll_x_mid_full = finder(frame, cfg, rl, ll, gates, lanes)
+
+        # --- Crosswalk (with_crosswalk=False when the caller schedules it) ---
+        crosswalk, cw_lines = False, []
+        if with_crosswalk:
+            crosswalk, cw_lines = self._crosswalk(frame, cfg, geometry)
+
+        # --- Lane type, tracking ---
+        lane_type = lane_type_of(rl_x_mid_full, ll_x_mid_full)
+        # unseen counters follow real measurements; steering follows the
+        # tracked lanes, which coast through short dropouts
+        self._update_unseen(lane_type)
+
+        if self._tracking(cfg):
+            rl_x_mid_full = self.rl_tracker.update(rl_x_mid_full)
+            ll_x_mid_full = self.ll_tracker.update(ll_x_mid_full)
+            lane_type = lane_type_of(rl_x_mid_full, ll_x_mid_full)
+            lane_confidence = {"left": self.ll_tracker.confidence, "right": self.rl_tracker.confidence}
+        else:
+            lane_confidence = {
+                "left": 1.0 if ll_x_mid_full is not None else 0.0,
+                "right": 1.0 if rl_x_mid_full is not None else 0.0,
+            }
+
+        frame_center = geometry["frame_center"]
+        if lane_type == "only_left":
+            frame_center -= preset["only_left_shift"]
+
+        # fallbacks use the full ROIs, not an adaptive band
+        rl_roi_center = (geometry["rl"].left + geometry["rl"].right) / 2.0
+        ll_roi_center = (geometry["ll"].left + geometry["ll"].right) / 2.0
+
+        if rl_x_mid_full is None and ll_x_mid_full is not None:
+            rl_x_mid_full = rl_roi_center + preset["right_fallback_offset"]
+        if ll_x_mid_full is None and rl_x_mid_full is not None:
+            ll_x_mid_full = ll_roi_center
+
+        if lane_type in ("both", "only_right", "only_left"):
+            lane_center = (rl_x_mid_full + ll_x_mid_full) / 2.0
+        else:
+            lane_center = frame_center
+
+        # --- Steering ---
+        error = frame_center - lane_center
+        steering_angle = preset["steering"](cfg, geometry, error, lane_type)
+        steering_angle = int(max(cfg.MIN_SERVO_ANGLE, min(cfg.MAX_SERVO_ANGLE, steering_angle)))
+
+        # --- Debug drawing ---
+        debug = {"rl_draw": None, "ll_draw": None, "combined": None, "crosswalk_draw": None,
+                 "cw_draw": None, "ipm_draw": None}
+        if any(cfg.get(flag) for flag in preset["draw_flags"]):
+            with profiler.span("debug_draw"):
+                self._draw(debug, frame, geometry, rl, ll, cw, lanes, cw_lines, crosswalk,
+                           rl_x_mid_full, ll_x_mid_full, frame_center, lane_center)
+
+        # --- Pixels through the lane finder this frame ---
+        uses_rois = engine in ("hough", "histogram")
+        processed_pixels = {
+            "rl": rl.area if uses_rois else 0,
+            "ll": ll.area if uses_rois else 0,
+            "ipm": lanes.get("ipm_pixels", 0),
+            "curve": sum(lanes["curves"][k].area for k in ("rl_curve", "ll_curve")) if "curves" in lanes else 0,
+            "cw": cw.area if with_crosswalk and preset["crosswalk"] is not None else 0,
+        }
+        processed_pixels["total"] = sum(processed_pixels.values())
+
+        return {
+            "steering_angle": steering_angle,
+            "error": error,
+            "lane_type": lane_type,
+            "lane_confidence": lane_confidence,
+            "processed_pixels": processed_pixels,
+            "crosswalk": crosswalk,
+            "debug": debug,
+            **preset["result_extras"],
+        }
+
+    def _draw(self, debug, frame, geometry, rl, ll, cw, lanes, cw_lines, crosswalk,
+              rl_x_mid_full, ll_x_mid_full, frame_center, lane_center):
+        height = frame.shape[0]
+        pool = self.buffers
+        # pooled: callers copy "combined" before handing it to another thread
+        vis = pooled_copy(pool, "vis", frame)
+
+        # ROI boxes
+        cv2.rectangle(vis, (rl.left, rl.top), (rl.right, rl.bottom), (255, 0, 0), 1)
+        cv2.rectangle(vis, (ll.left, ll.top), (ll.right, ll.bottom), (0, 255, 0), 1)
+        if self.preset["crosswalk"] is not None:
+            cv2.rectangle(vis, (cw.left + 1, cw.top), (cw.right - 1, cw.bottom), (0, 255, 255), 1)
+
+        for key, roi, x_full in (("rl", rl, rl_x_mid_full), ("ll", ll, ll_x_mid_full)):
+            lines = lanes[key]["lines"]
+            roi_draw = roi.crop(frame)
+            if roi_draw is not None:
+                roi_draw = pooled_copy(pool, f"{key}.draw", roi_draw)
+
+            # Hough lines on the ROI copy and on the full frame (with offset)
+            if lines is not None:
+                for line in lines:
+                    x1, y1, x2, y2 = line[0]
+                    if roi_draw is not None:
+                        cv2.line(roi_draw, (int(x1), int(y1)), (int(x2), int(y2)), (0,255,0), 1)
+                    cv2.line(vis, (roi.left + int(x1), roi.top + int(y1)), (roi.left + int(x2), roi.top + int(y2)), (0,255,0), 2)
+
+            # sliding windows of the histogram engine
+            draw_windows(vis, lanes[key]["windows"], roi.left, roi.top)
+
+            if x_full is not None:
+                y = lanes["curves"]["lookahead_row"] if "curves" in lanes else int((roi.top + roi.bottom)/2)
+                cv2.circle(vis, (int(x_full), y), 4, (0,255,0), -1)
+            debug[f"{key}_draw"] = roi_draw
+
+        # fitted curves of the curve engine
+        if "curves" in lanes:
+            curves = lanes["curves"]
+            self.rl_curve.draw(vis, curves["rl_curve"].left, curves["rl_curve"].top, curves["rl_curve"].height)
+            self.ll_curve.draw(vis, curves["ll_curve"].left, curves["ll_curve"].top, curves["ll_curve"].height)
+
+        # show lane center / frame center
+        cv2.line(vis, (int(frame_center), 0), (int(frame_center), height), (0,0,255), 1)
+        cv2.line(vis, (int(lane_center), 0), (int(lane_center), height), (255,0,255), 1)
+
+        if self.preset["crosswalk"] is not None:
+            cv2.putText(vis, f"crosswalk:{crosswalk}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,255), 2)
+            cw_draw = cw.crop(frame)
+            if cw_draw is not None:
+                cw_draw = pooled_copy(pool, "cw.draw", cw_draw)
+            for line in cw_lines:
+                x1, y1, x2, y2 = line[0]
+                if cw_draw is not None:
+                    cv2.line(cw_draw, (int(x1), int(y1)), (int(x2), int(y2)), (0,255,0), 1)
+                cv2.line(vis, (cw.left + int(x1), cw.top + int(y1)), (cw.left + int(x2), cw.top + int(y2)), (0,255,255), 2)
+            debug["cw_draw"] = cw_draw
+
+        debug["ipm_draw"] = lanes.get("birdseye")
+        debug["combined"] = vis
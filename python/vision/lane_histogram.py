@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+from utils.buffer_pool import pooled
+
+
+def lane_windows(binary, n_windows, margin, min_pixels, base_range=None):
+    """
+        Sliding-window search on a binary lane ROI. The column histogram of
+        the bottom half gives the starting x, then n_windows stacked windows
+        follow the lane upwards, each re-centred on the mean x of its white
+        pixels. Returns (x_mid, windows) in ROI coordinates, x_mid None when
+        no column has min_pixels set; windows are (top, bottom, left, right).
+    """
+    height, width = binary.shape[:2]
+    hist = np.count_nonzero(binary[height // 2:], axis=0)
+
+    lo, hi = 0, width
+    if base_range is not None:
+        lo, hi = max(0, int(base_range[0])), min(width, int(base_range[1]))
+        if hi <= lo:
+            return None, []
+    base = lo + int(np.argmax(hist[lo:hi]))
+    if hist[base] < min_pixels:
+        return None, []
+
+    window_h = max(1, height // n_windows)
+    x = float(base)
+    centers = []
+    windows = []
+    for i in range(n_windows):
+        bottom = height - i * window_h
+        top = max(0, bottom - window_h)
+        left = max(0, int(x - margin))
+        right = min(width, int(x + margin) + 1)
+        counts = np.count_nonzero(binary[top:bottom, left:right], axis=0)
+        total = counts.sum()
+        if total >= min_pixels:
+            x = left + float(np.dot(counts, np.arange(counts.shape[0]))) / total
+            centers.append(x)
+        windows.append((top, bottom, left, right))
+
+    if not centers:
+        return float(base), windows
+    # same meaning as the Hough engines: x in the middle of the ROI height
+    return float(np.mean(centers)), windows
+
+
+def find_lane_x(roi, threshold, cfg, base_range=None, pool=None, key="hist"):
+    """Threshold a BGR lane ROI and run lane_windows on it."""
+    if roi is None:
+        return None, None, []
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=pooled(pool, f"{key}.gray", roi.shape[:2]))
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY, dst=gray)
+    x_mid, windows = lane_windows(binary, cfg.HIST_WINDOWS, cfg.HIST_MARGIN, cfg.HIST_MIN_PIXELS, base_range)
+    return x_mid, binary, windows
+
+
+def draw_windows(vis, windows, offset_x, offset_y, color=(255, 255, 0)):
+    for top, bottom, left, right in windows:
+        cv2.rectangle(vis, (offset_x + left, offset_y + top), (offset_x + right, offset_y + bottom), color, 1)
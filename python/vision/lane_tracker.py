@@ -0,0 +1,96 @@
+import math
+
+
+class LaneTracker:
+    """
+        Constant-velocity Kalman filter on one lane line's x position
+        (full-frame pixels, one step per frame). State is [x, v] with a 2x2
+        covariance, written out by hand since it runs twice per frame.
+    """
+    def __init__(self, process_noise=4.0, measurement_noise=6.0, max_coast=5,
+                 gate_sigma=3.0, min_gate=10.0, max_gate=80.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.max_coast = max_coast
+        self.gate_sigma = gate_sigma
+        self.min_gate = min_gate
+        self.max_gate = max_gate
+        self.reset()
+
+    def configure(self, cfg):
+        self.process_noise = cfg.LANE_TRACK_PROCESS_NOISE
+        self.measurement_noise = cfg.LANE_TRACK_MEASUREMENT_NOISE
+        self.max_coast = cfg.LANE_TRACK_MAX_COAST
+        self.gate_sigma = cfg.LANE_TRACK_GATE_SIGMA
+        self.min_gate = cfg.LANE_TRACK_MIN_GATE
+        self.max_gate = cfg.LANE_TRACK_MAX_GATE
+
+    def reset(self):
+        self.x = None
+        self.v = 0.0
+        self.p00, self.p01, self.p11 = 0.0, 0.0, 0.0
+        self.coast = 0
+
+    @property
+    def active(self):
+        return self.x is not None
+
+    def predict(self):
+        """Advance one frame; returns the predicted x (None if not tracking)."""
+        if self.x is None:
+            return None
+        q = self.process_noise ** 2
+        self.x += self.v
+        # P = F P F^T + Q, F = [[1, 1], [0, 1]], Q from white acceleration noise
+        p00 = self.p00 + 2 * self.p01 + self.p11 + q / 4
+        p01 = self.p01 + self.p11 + q / 2
+        p11 = self.p11 + q
+        self.p00, self.p01, self.p11 = p00, p01, p11
+        return self.x
+
+    def gate(self):
+        """Half-width (px) of the window measurements must fall in, or None."""
+        if self.x is None:
+            return None
+        sigma = math.sqrt(self.p00 + self.measurement_noise ** 2)
+        return max(self.min_gate, min(self.max_gate, self.gate_sigma * sigma))
+
+    def update(self, z):
+        """Fuse a measurement; z=None means the lane was not seen this frame."""
+        if z is None:
+            if self.x is not None:
+                self.coast += 1
+                if self.coast > self.max_coast:
+                    self.reset()
+            return self.x
+
+        if self.x is None:
+            r = self.measurement_noise ** 2
+            self.x, self.v = float(z), 0.0
+            self.p00, self.p01, self.p11 = r, 0.0, r
+            self.coast = 0
+            return self.x
+
+        r = self.measurement_noise ** 2
+        s = self.p00 + r
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        innovation = z - self.x
+        self.x += k0 * innovation
+        self.v += k1 * innovation
+        # P = (I - K H) P
+        p00 = (1 - k0) * self.p00
+        p01 = (1 - k0) * self.p01
+        p11 = self.p11 - k1 * self.p01
+        self.p00, self.p01, self.p11 = p00, p01, p11
+        self.coast = 0
+        return self.x
+
+    @property
+    def confidence(self):
+        """0..1: drops while coasting and while the position is uncertain."""
+        if self.x is None:
+            return 0.0
+        r = self.measurement_noise ** 2
+        certainty = r / (r + self.p00)
+        return certainty * (1.0 - self.coast / (self.max_coast + 1))
@@ -0,0 +1,96 @@
+import math
+import threading
+
+
+class Roi:
+    """Pixel bounds of one region plus ready-made slices for cropping."""
+    __slots__ = ("top", "bottom", "left", "right", "slices")
+
+    def __init__(self, top, bottom, left, right):
+        self.top = top
+        self.bottom = bottom
+        self.left = left
+        self.right = right
+        self.slices = (slice(top, bottom), slice(left, right))
+
+    def __iter__(self):
+        return iter((self.top, self.bottom, self.left, self.right))
+
+    @property
+    def width(self):
+        return self.right - self.left
+
+    @property
+    def height(self):
+        return self.bottom - self.top
+
+    @property
+    def area(self):
+        return max(0, self.width) * max(0, self.height)
+
+    def narrowed(self, center_x, half_width):
+        """Band of this region around center_x, clipped to the region."""
+        left = max(self.left, int(center_x - half_width))
+        right = min(self.right, int(math.ceil(center_x + half_width)))
+        if right <= left:
+            return self
+        return Roi(self.top, self.bottom, left, right)
+
+    def crop(self, frame):
+        """View of the region (no copy); None when the region is empty."""
+        roi = frame[self.slices]
+        return roi if roi.size != 0 else None
+
+    def as_dict(self):
+        return {"top": self.top, "bottom": self.bottom, "left": self.left, "right": self.right}
+
+
+def roi_from_config(cfg, prefix, width, height):
+    return Roi(*cfg.roi_bounds(prefix, width, height))
+
+
+class RoiGeometryCache:
+    """
+        Pixel geometry shared by the detectors, computed once per
+        (detector, frame size, config version, extra state) and reused
+        until one of them changes. The last geometry of each detector is
+        kept so the debug renderer and the stream UI can draw the exact
+        regions that were processed.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, cfg, width, height, build, state=()):
+        key = (name, width, height, cfg.version, state)
+        geometry = self._entries.get(key)
+        if geometry is None:
+            geometry = build(cfg, width, height, *state)
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = geometry
+        self._latest[name] = geometry
+        return geometry
+
+    def latest(self):
+        """Last geometry per detector, as plain JSON-friendly dicts."""
+        out = {}
+        for name, geometry in list(self._latest.items()):
+            out[name] = {
+                key: (value.as_dict() if isinstance(value, Roi) else value)
+                for key, value in geometry.items()
+                # lookup tables (remap maps etc.) are not worth shipping
+                if isinstance(value, (Roi, int, float, str, bool))
+            }
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+
+
+geometry_cache = RoiGeometryCache()
@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+
+from utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class _Task:
+    __slots__ = ("fn", "every", "trigger", "value", "last_frame", "last_time", "cost", "deferred", "runs", "worker")
+
+    def __init__(self, fn, every, trigger, default):
+        self.fn = fn
+        self.every = every
+        self.trigger = trigger
+        self.value = default
+        self.last_frame = None
+        self.last_time = None
+        self.cost = 0.0
+        self.deferred = 0
+        self.runs = 0
+        self.worker = None
+
+
+class _Worker(threading.Thread):
+    """Runs one task off the loop thread; a submit while busy is dropped."""
+    def __init__(self, name, task):
+        super().__init__(name=f"detector-{name}", daemon=True)
+        self.task = task
+        self.cond = threading.Condition()
+        self.pending = None
+        self.busy = False
+
+    @property
+    def idle(self):
+        return not self.busy and self.pending is None
+
+    def submit(self, frame_no, args, kwargs):
+        with self.cond:
+            if self.busy or self.pending is not None:
+                return False
+            self.pending = (frame_no, time.perf_counter(), args, kwargs)
+            self.cond.notify()
+            return True
+
+    def run(self):
+        task = self.task
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                frame_no, submitted, args, kwargs = self.pending
+                self.pending = None
+                self.busy = True
+            start = time.perf_counter()
+            try:
+                value = task.fn(*args, **kwargs)
+            except Exception:
+                logger.exception(f"{self.name} failed")
+                value = task.value
+            cost = time.perf_counter() - start
+            # the result is as old as the frame it was computed from
+            task.value = value
+            task.last_frame = frame_no
+            task.last_time = submitted
+            task.cost = cost if task.runs == 0 else 0.8 * task.cost + 0.2 * cost
+            task.runs += 1
+            with self.cond:
+                self.busy = False
+
+
+class DetectorScheduler:
+    """
+        Runs secondary detectors (crosswalk, AprilTag, traffic light) less
+        often than the lane loop and hands back their last result in
+        between. A detector runs when
+          - it has not run for `every` frames, or
+          - its cheap trigger fires (called with the detector's arguments),
+        unless the frame has already used budget_ms, in which case it is
+        deferred, at most max_defer frames in a row.
+    """
+    def __init__(self, budget_ms=0, max_defer=5):
+        self.budget = budget_ms / 1000.0
+        self.max_defer = max_defer
+        self.frame = 0
+        self.frame_start = time.perf_counter()
+        self.tasks = {}
+
+    def add(self, name, fn, every=1, trigger=None, default=None, threaded=False):
+        """
+            threaded=True runs the detector on its own worker thread: run()
+            hands it copies of the array arguments and returns at once with
+            the cached result; while the worker is busy new work is dropped.
+        """
+        task = _Task(fn, max(1, every), trigger, default)
+        if threaded:
+            task.worker = _Worker(name, task)
+            task.worker.start()
+        self.tasks[name] = task
+
+    def configure(self, name, every):
+        self.tasks[name].every = max(1, every)
+
+    def begin_frame(self):
+        """Call at the start of every loop tick (before capture)."""
+        self.frame += 1
+        self.frame_start = time.perf_counter()
+
+    def _due(self, name, task, args, kwargs):
+        if task.last_frame is None or self.frame - task.last_frame >= task.every:
+            return True
+        if task.trigger is not None and task.trigger(*args, **kwargs):
+            profiler.count(f"scheduler.{name}.triggered")
+            return True
+        return False
+
+    def run(self, name, *args, **kwargs):
+        """Run the detector if it is due, else return its cached result."""
+        task = self.tasks[name]
+        if task.worker is not None and not task.worker.idle:
+            return task.value
+        if not self._due(name, task, args, kwargs):
+            return task.value
+
+        if task.worker is not None:
+            args = tuple(a.copy() if hasattr(a, "copy") else a for a in args)
+            task.worker.submit(self.frame, args, kwargs)
+            return task.value
+
+        if self.budget > 0 and task.deferred < self.max_defer and task.last_frame is not None:
+            spent = time.perf_counter() - self.frame_start
+            if spent + task.cost > self.budget:
+                task.deferred += 1
+                profiler.count(f"scheduler.{name}.deferred")
+                return task.value
+
+        start = time.perf_counter()
+        task.value = task.fn(*args, **kwargs)
+        now = time.perf_counter()
+        # moving average of the detector's cost, for the budget check
+        task.cost = (now - start) if task.runs == 0 else 0.8 * task.cost + 0.2 * (now - start)
+        task.last_frame = self.frame
+        task.last_time = now
+        task.deferred = 0
+        task.runs += 1
+        return task.value
+
+    def age(self, name):
+        """(frames, seconds) since the cached result was produced; None if never run."""
+        task = self.tasks[name]
+        if task.last_frame is None:
+            return None
+        return self.frame - task.last_frame, time.perf_counter() - task.last_time
+
+    def result(self, name):
+        """(cached value, age) without running anything."""
+        return self.tasks[name].value, self.age(name)
+
+    def status(self):
+        out = {}
+        for name, task in self.tasks.items():
+            age = self.age(name)
+            out[name] = {
+                "every": task.every,
+                "runs": task.runs,
+                "cost_ms": task.cost * 1e3,
+                "age_frames": age[0] if age else None,
+                "age_s": age[1] if age else None,
+            }
+        return out
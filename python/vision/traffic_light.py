@@ -1,82 +1,154 @@
 import cv2
 import numpy as np
-from config_city import (
-    TL_TOP_ROI,
-    TL_BOTTOM_ROI,
-    TL_LEFT_ROI,
-    TL_RIGHT_ROI,
-)
 import config_city
+from utils.runtime_config import get_runtime_config
+from utils.buffer_pool import BufferPool
+from vision.roi_geometry import roi_from_config, geometry_cache
+
+# class labels of the lookup table, in priority order (red wins)
+COLORS = ("RED", "GREEN")
+# above this many candidate blobs, brightness comes from one bincount
+TL_BINCOUNT_BLOBS = 64
+
+
+def traffic_light_geometry(cfg, width, height):
+    return {"tl": roi_from_config(cfg, "TL", width, height)}
+
+
+def _color_ranges(cfg):
+    return (
+        ("RED", tuple(tuple(map(tuple, r)) for r in cfg.TL_RED_RANGES)),
+        ("GREEN", tuple(tuple(map(tuple, r)) for r in cfg.TL_GREEN_RANGES)),
+    )
+
+
+def build_color_lut(ranges, bits):
+    """
+        Class label (0 = none, 1 + index in COLORS) for every quantized BGR
+        color, classified once through HSV at the center of its bin.
+    """
+    levels = 1 << bits
+    step = 256 // levels
+    centers = np.arange(levels, dtype=np.uint8) * step + step // 2
+    b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+    bgr = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1).reshape(-1, 1, 3)
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+
+    lut = np.zeros(levels ** 3, dtype=np.uint8)
+    # lower priority first so red overwrites an overlap
+    for color_name, color_ranges in reversed(ranges):
+        label = COLORS.index(color_name) + 1
+        for lower, upper in color_ranges:
+            m = cv2.inRange(hsv, np.array(lower), np.array(upper)).ravel()
+            lut[m > 0] = label
+    return lut
+
+
+def build_channel_luts(bits):
+    """cv2.LUT tables turning B, G and R into their bits of the color index."""
+    quantized = np.arange(256, dtype=np.uint16) >> (8 - bits)
+    return [(quantized << (bits * k)).reshape(256, 1) for k in (2, 1, 0)]
+
 
 class TrafficLightDetector:
     def __init__(self):
-        pass
-    
+        self.config = get_runtime_config(config_city)
+        self.buffers = BufferPool("traffic_light_buffers")
+        self._lut_key = None
+        self._lut = None
+        self._channel_luts = None
+
+    def _color_lut(self, cfg):
+        # rebuilt only when the ranges or the quantization change, not on
+        # every config edit
+        key = (_color_ranges(cfg), cfg.TL_LUT_BITS)
+        if key != self._lut_key:
+            self._lut = build_color_lut(key[0], key[1])
+            self._channel_luts = build_channel_luts(key[1])
+            self._lut_key = key
+        return self._lut
+
+    def split(self, frame):
+        shape = frame.shape[:2]
+        return [cv2.extractChannel(frame, c, dst=self.buffers.get(f"chan{c}", shape)) for c in range(3)]
+
+    def classify(self, frame, cfg, channels=None):
+        """Per-pixel class labels of a BGR frame through the lookup table."""
+        lut = self._color_lut(cfg)
+        channels = self.split(frame) if channels is None else channels
+        shape = frame.shape[:2]
+        # the index is built with 8-bit table lookups per channel; numpy
+        # only does the final gather
+        index = cv2.LUT(channels[0], self._channel_luts[0], dst=self.buffers.get("index", shape, np.uint16))
+        part = self.buffers.get("index_part", shape, np.uint16)
+        for chan, table in zip(channels[1:], self._channel_luts[1:]):
+            cv2.bitwise_or(index, cv2.LUT(chan, table, dst=part), dst=index)
+        return np.take(lut, index, out=self.buffers.get("labels", shape))
+
+    def blob_means(self, value, components, stats, candidates):
+        """Mean brightness of the candidate blobs only."""
+        if len(candidates) > TL_BINCOUNT_BLOBS:
+            # noisy frame: one pass over the image beats a box per blob
+            sums = np.bincount(components.ravel(), weights=value.ravel(), minlength=len(stats))
+            return sums[candidates] / stats[candidates, cv2.CC_STAT_AREA]
+        means = []
+        for i in candidates:
+            x, y, w, h = stats[i, :4]
+            box = (slice(y, y + h), slice(x, x + w))
+            means.append(cv2.mean(value[box], mask=(components[box] == i).view(np.uint8))[0])
+        return means
+
     def detect(self, frame):
-        
+
         if frame is None:
             return None, None
-        
+
         height, width = frame.shape[:2]
-        
-        # FIX: convert to int
-        tl_left   = int(TL_LEFT_ROI   * width)
-        tl_right  = int(TL_RIGHT_ROI  * width)
-        tl_top    = int(TL_TOP_ROI    * height)
-        tl_bottom = int(TL_BOTTOM_ROI * height)
-        
-        frame = frame[tl_top:tl_bottom, tl_left:tl_right]
-        
-        debug_frame = frame.copy() if config_city.DEBUG else None
-        
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        
-        colors = {
-            "RED": [
-                ([0,100,100], [10,255,255]),
-                ([170,100,100], [180,255,255])
-            ],
-            "GREEN": [
-                ([40,50,50], [90,255,255])
-            ]
-        }
-        
+        cfg = self.config.snapshot()
+
+        geometry = geometry_cache.get("traffic_light", cfg, width, height, traffic_light_geometry)
+
+        frame = frame[geometry["tl"].slices]
+
+        debug_frame = frame.copy() if cfg.DEBUG else None
+
+        channels = self.split(frame)
+        labels = self.classify(frame, cfg, channels)
+        # V of HSV is max(B, G, R)
+        value = cv2.max(channels[0], channels[1], dst=self.buffers.get("value", labels.shape))
+        cv2.max(value, channels[2], dst=value)
+
+        mask = self.buffers.get("mask", labels.shape)
         light_color = None
-        
-        for color_name, ranges in colors.items():
-            mask_color = None
-            
-            for lower, upper in ranges:
-                lower = np.array(lower)
-                upper = np.array(upper)
-                m = cv2.inRange(hsv, lower, upper)
-                
-                if mask_color is None:
-                    mask_color = m
-                else:
-                    mask_color = cv2.bitwise_or(mask_color, m)
-
-            mask_color = cv2.medianBlur(mask_color, 5)
-
-            contours, _ = cv2.findContours(mask_color, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for c in contours:
-                if cv2.contourArea(c) < 5:
-                    continue
-                
-                mask_temp = np.zeros_like(mask_color)
-                cv2.drawContours(mask_temp, [c], -1, 255, -1)
-                
-                mean_val = cv2.mean(hsv[:,:,2], mask=mask_temp)[0]
-                if mean_val < 180:
+
+        # each color is labelled on its own, so touching red, green and dim
+        # pixels stay separate blobs; red is checked first and wins
+        for label, color_name in enumerate(COLORS, 1):
+            cv2.compare(labels, label, cv2.CMP_EQ, dst=mask)
+            x0, y0, w0, h0 = cv2.boundingRect(mask)
+            if w0 == 0:
+                continue
+            # blur and label only around the lit pixels; the 2 px margin
+            # (median radius) keeps the result the same as on the full mask
+            x0, y0 = max(x0 - 2, 0), max(y0 - 2, 0)
+            crop = (slice(y0, y0 + h0 + 4), slice(x0, x0 + w0 + 4))
+            blurred = cv2.medianBlur(mask[crop], 5, dst=self.buffers.get("mask_blur", mask[crop].shape))
+            n, components, stats, centroids = cv2.connectedComponentsWithStats(
+                blurred, connectivity=8, ltype=cv2.CV_16U)
+            candidates = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= cfg.TL_MIN_AREA) + 1
+            if len(candidates) == 0:
+                continue
+            means = self.blob_means(value[crop], components, stats, candidates)
+
+            for i, mean_val in zip(candidates, means):
+                if mean_val < cfg.TL_MIN_BRIGHTNESS:
                     continue
-                
+
                 light_color = color_name
-                
-                if config_city.DEBUG:
-                    (cx, cy), radius = cv2.minEnclosingCircle(c)
-                    center = (int(cx), int(cy))
-                    radius = int(radius)
+
+                if cfg.DEBUG:
+                    center = (int(centroids[i][0]) + x0, int(centroids[i][1]) + y0)
+                    radius = int(max(stats[i, cv2.CC_STAT_WIDTH], stats[i, cv2.CC_STAT_HEIGHT]) / 2)
                     cv2.circle(debug_frame, center, radius, (0,255,0), 2)
                     cv2.putText(debug_frame, f"{color_name} ({int(mean_val)})",
                                 (center[0]-radius, center[1]-radius-5),
@@ -84,5 +156,5 @@ class TrafficLightDetector:
 
             if light_color is not None:
                 break
-        
+
         return light_color, debug_frame